@@ -0,0 +1,65 @@
+"""
+Startup benchmark for the ingestion CLI.
+
+Times `python -m ingestion.cli --help` in fresh interpreters and reports
+which heavy libraries got imported along the way. With the lazy processor
+registry none of them should be: they load only once a processor is used.
+
+    python scripts/bench_cli_startup.py --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "src")
+HEAVY_MODULES = ("pymupdf", "fitz", "pdfplumber", "PIL", "numpy")
+
+_PROBE = (
+    "import sys, ingestion.cli; "
+    f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+
+def time_bare_interpreter(runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def time_help(runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "ingestion.cli", "--help"],
+            cwd=SRC_DIR, stdout=subprocess.DEVNULL, check=True,
+        )
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=10, help="Interpreter launches to time")
+    args = ap.parse_args()
+
+    baseline = time_bare_interpreter(args.runs)
+    timings = time_help(args.runs)
+    loaded = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=SRC_DIR, capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+    print(f"bare interpreter        median {statistics.median(baseline) * 1000:7.1f} ms")
+    print(f"ingestion.cli --help    median {statistics.median(timings) * 1000:7.1f} ms")
+    print(f"heavy modules imported: {loaded or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
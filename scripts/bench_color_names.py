@@ -0,0 +1,87 @@
+"""
+Micro-benchmark for span color classification in src/ingestion/utils.py.
+
+Compares the original per-call loop, the memoized get_color_name and the
+batch get_color_names on a synthetic page set with a realistic color mix:
+a few dominant text colors plus a long tail of one-off values.
+
+    python scripts/bench_color_names.py --spans 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, List, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(SCRIPT_DIR), "src"))
+
+from ingestion.utils import get_color_name, get_color_names  # noqa: E402
+
+_LEGACY_COLORS = {
+    "red": (255, 0, 0), "green": (0, 128, 0), "blue": (0, 0, 255),
+    "yellow": (255, 255, 0), "cyan": (0, 255, 255), "magenta": (255, 0, 255),
+    "white": (255, 255, 255), "black": (0, 0, 0), "gray": (128, 128, 128),
+    "maroon": (128, 0, 0), "navy": (0, 0, 128), "olive": (128, 128, 0),
+    "teal": (0, 128, 128), "purple": (128, 0, 128), "aquamarine": (127, 255, 212),
+    "lime": (0, 255, 0), "silver": (192, 192, 192)
+}
+
+
+def legacy_get_color_name(color: Optional[int]) -> str:
+    """The pre-vectorization implementation, rebuilt per call as it was."""
+    if color is None:
+        return "No Color"
+    r1, g1, b1 = (color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF
+    colors = dict(_LEGACY_COLORS)
+    min_distance = float("inf")
+    closest_color_name = "unknown"
+    for name, (r2, g2, b2) in colors.items():
+        squared_distance = (r2 - r1) ** 2 + (g2 - g1) ** 2 + (b2 - b1) ** 2
+        if squared_distance < min_distance:
+            min_distance = squared_distance
+            closest_color_name = name
+    return closest_color_name
+
+
+def synthetic_span_colors(n: int, seed: int = 0) -> List[Optional[int]]:
+    rng = random.Random(seed)
+    common = [0x000000, 0x231F20, 0xFFFFFF, 0x1F4E79, 0xC00000, 0x808080]
+    colors: List[Optional[int]] = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.9:
+            colors.append(rng.choice(common))
+        elif roll < 0.98:
+            colors.append(rng.randrange(0x1000000))
+        else:
+            colors.append(None)
+    return colors
+
+
+def timed(label: str, fn: Callable[[], List[str]], n: int) -> List[str]:
+    start = time.perf_counter()
+    names = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms  {n / elapsed / 1e6:7.2f} M spans/s")
+    return names
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--spans", type=int, default=200_000, help="Number of span colors to classify")
+    args = ap.parse_args()
+
+    colors = synthetic_span_colors(args.spans)
+    print(f"{args.spans} spans, {len(set(colors))} distinct colors")
+    expected = timed("legacy loop", lambda: [legacy_get_color_name(c) for c in colors], args.spans)
+    get_color_name.cache_clear()
+    memoized = timed("get_color_name (memoized)", lambda: [get_color_name(c) for c in colors], args.spans)
+    batch = timed("get_color_names (batch)", lambda: get_color_names(colors), args.spans)
+    if memoized != expected or batch != expected:
+        sys.exit("Mismatch against the legacy implementation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Load test for the chat server's /api/chat endpoint.
+
+Runs simulated multi-turn sessions at increasing concurrency and writes
+p50/p95/p99 latencies, throughput and error rate to a JSON file. A turn
+fails on a non-200 status, a transport error, an empty reply, or an
+"[Error: ...]" frame in the stream (the server reports backend failures
+that way after it has already answered 200).
+
+For a GPU-free run, start scripts/mock_vllm.py and the chat server first:
+
+    python scripts/mock_vllm.py &
+    (cd src && hypercorn app:app --bind 127.0.0.1:5000) &
+    python scripts/bench_load.py --concurrency 1,16,64,256 --output bench.json
+
+Pass --baseline with an earlier results file to flag regressions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional
+import httpx
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "dataset.jsonl")
+# Prefix of the frame the server streams when generation fails mid-response
+ERROR_FRAME_PREFIX = "[Error: "
+FOLLOW_UPS = [
+    "Can you explain that in more detail?",
+    "How does that relate to TAMR?",
+    "Summarize that in one sentence.",
+]
+
+
+def load_questions(path: str) -> List[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line)["instruction"] for line in f if line.strip()]
+    except OSError:
+        return ["What does STARS stand for?"]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def run_turn(client: httpx.AsyncClient, url: str, session_id: str, message: str) -> Dict:
+    start = time.perf_counter()
+    ttft = None
+    chars = 0
+    try:
+        async with client.stream(
+            "POST", url, json={"session_id": session_id, "message": message}
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return {"ok": False, "status": response.status_code}
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                content = json.loads(line[6:]).get("content", "")
+                if content.startswith(ERROR_FRAME_PREFIX):
+                    await response.aread()
+                    return {"ok": False, "status": "error_frame"}
+                if content and ttft is None:
+                    ttft = time.perf_counter() - start
+                chars += len(content)
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        return {"ok": False, "status": type(e).__name__}
+    return {
+        "ok": ttft is not None,
+        "status": 200,
+        "ttft": ttft,
+        "duration": time.perf_counter() - start,
+        "chars": chars,
+    }
+
+
+async def run_session(client, url, questions, turns, results) -> None:
+    session_id = str(uuid.uuid4())
+    message = random.choice(questions)
+    for _ in range(turns):
+        results.append(await run_turn(client, url, session_id, message))
+        message = random.choice(FOLLOW_UPS)
+
+
+async def run_level(url: str, concurrency: int, sessions: int, turns: int, questions: List[str]) -> Dict:
+    results: List[Dict] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    timeout = httpx.Timeout(30.0, read=300.0)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded():
+            async with semaphore:
+                await run_session(client, url, questions, turns, results)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded() for _ in range(sessions)))
+        elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r["ok"]]
+    ttfts = [r["ttft"] for r in ok]
+    durations = [r["duration"] for r in ok]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+        "errors_by_status": statuses,
+        "elapsed_seconds": elapsed,
+        "requests_per_second": len(ok) / elapsed,
+        "chars_per_second": sum(r["chars"] for r in ok) / elapsed,
+        "ttft_p50": percentile(ttfts, 50),
+        "ttft_p95": percentile(ttfts, 95),
+        "ttft_p99": percentile(ttfts, 99),
+        "duration_p50": percentile(durations, 50),
+        "duration_p95": percentile(durations, 95),
+        "duration_p99": percentile(durations, 99),
+    }
+
+
+# Metric -> True if higher is better
+COMPARED_METRICS = {
+    "ttft_p50": False, "ttft_p95": False, "ttft_p99": False,
+    "requests_per_second": True, "error_rate": False,
+}
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """List metrics that got worse than the baseline by more than `tolerance`."""
+    regressions = []
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in results["levels"]:
+        old = previous.get(level["concurrency"])
+        if old is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            new_value, old_value = level[metric], old[metric]
+            if new_value is None or old_value is None:
+                continue
+            if metric == "error_rate":
+                worse = new_value > old_value + tolerance
+            elif higher_is_better:
+                worse = new_value < old_value * (1 - tolerance)
+            else:
+                worse = new_value > old_value * (1 + tolerance)
+            if worse:
+                regressions.append(
+                    f"concurrency {level['concurrency']}: {metric} {old_value:.4g} -> {new_value:.4g}"
+                )
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load test /api/chat")
+    ap.add_argument("--url", default="http://127.0.0.1:5000/api/chat")
+    ap.add_argument("--concurrency", default="1,8,32,128",
+                    help="Comma-separated concurrency levels, run in order")
+    ap.add_argument("--sessions", type=int, default=None,
+                    help="Sessions per level (default: 4x the concurrency)")
+    ap.add_argument("--turns", type=int, default=3, help="Turns per session")
+    ap.add_argument("--output", default="bench_results.json")
+    ap.add_argument("--baseline", help="Earlier results file to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.1,
+                    help="Allowed relative slowdown before a metric counts as regressed")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    random.seed(args.seed)
+    questions = load_questions(DATASET_PATH)
+    levels = []
+    for concurrency in map(int, args.concurrency.split(",")):
+        sessions = args.sessions or concurrency * 4
+        print(f"Running {sessions} sessions x {args.turns} turns at concurrency {concurrency}...")
+        level = asyncio.run(run_level(args.url, concurrency, sessions, args.turns, questions))
+        levels.append(level)
+        print(
+            f"  TTFT p50/p95/p99: {level['ttft_p50']}/{level['ttft_p95']}/{level['ttft_p99']} s, "
+            f"{level['requests_per_second']:.1f} req/s, error rate {level['error_rate']:.2%}"
+        )
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "url": args.url,
+        "turns": args.turns,
+        "levels": levels,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
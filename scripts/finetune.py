@@ -1,6 +1,6 @@
+import argparse
 import os
 import torch
-from datasets import load_dataset
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
 from transformers import (
     AutoModelForCausalLM,
@@ -14,6 +14,15 @@ except ImportError:
     from trl import SFTTrainer
     SFTConfig = None
 
+from prepare_dataset import (
+    BATCHING_MODES,
+    EVAL_FRACTION,
+    DataCollator,
+    load_tokenized,
+    padding_report,
+    stream_tokenized,
+)
+
 # Configuration
 MODEL_NAME = "/opt/models/Meta-Llama-3.1-8B-Instruct"
 # Get absolute path to the data directory relative to this script
@@ -21,8 +30,32 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
 DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "dataset.jsonl")
 OUTPUT_DIR = os.path.join(PROJECT_ROOT, "models", "stars-adapter")
+BATCH_SIZE = 2
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="LoRA fine-tune on data/dataset.jsonl")
+    ap.add_argument(
+        "--batching", choices=BATCHING_MODES, default="pack",
+        help="Pack examples into full-length rows (needs flash-attn), or batch examples of similar length",
+    )
+    ap.add_argument("--max-seq-length", type=int, default=2048, help="Longest training row in tokens")
+    ap.add_argument(
+        "--streaming", action="store_true",
+        help="Read JSONL shards lazily (always packed) and hold out an eval split, for corpora too large to cache",
+    )
+    ap.add_argument("--data", nargs="+", default=[DATASET_PATH], help="JSONL shards or glob patterns to stream")
+    ap.add_argument("--eval-fraction", type=float, default=EVAL_FRACTION, help="Share of examples held out for eval")
+    ap.add_argument("--max-steps", type=int, default=-1, help="Optimizer steps; required with --streaming")
+    ap.add_argument("--seed", type=int, default=0, help="Shuffle seed for streamed shards")
+    args = ap.parse_args()
+    if args.streaming and args.max_steps <= 0:
+        ap.error("--streaming needs --max-steps: a streamed dataset has no length to derive epochs from")
+    if args.streaming and args.batching != "pack":
+        ap.error("--streaming always packs; length bucketing needs the cached dataset")
+    return args
 
 def main():
+    args = parse_args()
     print(f"Loading model: {MODEL_NAME}")
     
     # 1. Load Tokenizer
@@ -39,11 +72,15 @@ def main():
     )
 
     # 3. Load Base Model
+    # Packed rows hold several examples; only flash_attention_2 reads the
+    # restarted position_ids and keeps attention within each example.
+    packed = args.streaming or args.batching == "pack"
     model = AutoModelForCausalLM.from_pretrained(
         MODEL_NAME,
         quantization_config=bnb_config,
         device_map="auto",
         trust_remote_code=True,
+        **({"attn_implementation": "flash_attention_2"} if packed else {}),
     )
     
     # Prepare model for k-bit training
@@ -63,39 +100,31 @@ def main():
     model.print_trainable_parameters()
 
     # 5. Load Dataset
-    dataset = load_dataset("json", data_files=DATASET_PATH, split="train")
-    
-    # formatting function for instruction dataset
-    def formatting_prompts_func(examples):
-        output_texts = []
-        
-        # Handle both batched (dict of lists) and single (dict) inputs
-        instructions = examples['instruction']
-        inputs = examples.get('input', []) # might be missing or None
-        outputs = examples['output']
-        
-        # If 'instructions' is a string, it's a single example (batched=False)
-        if isinstance(instructions, str):
-            # For single example (batched=False), we must return a single string, NOT a list
-            input_text = inputs if inputs else ""
-            if input_text:
-                return f"### Instruction:\n{instructions}\n\n### Input:\n{input_text}\n\n### Response:\n{outputs}"
-            else:
-                return f"### Instruction:\n{instructions}\n\n### Response:\n{outputs}"
-        
-        # Batched logic (returns list)
-        for i in range(len(instructions)):
-            instruction = instructions[i]
-            input_text = inputs[i] if i < len(inputs) and inputs[i] else ""
-            output = outputs[i]
-            
-            if input_text:
-                text = f"### Instruction:\n{instruction}\n\n### Input:\n{input_text}\n\n### Response:\n{output}"
-            else:
-                text = f"### Instruction:\n{instruction}\n\n### Response:\n{output}"
-            output_texts.append(text)
-            
-        return output_texts
+    backend = tokenizer.backend_tokenizer
+    eval_dataset = None
+    if args.streaming:
+        # Read shard by shard with bounded buffers; nothing is materialized
+        dataset = stream_tokenized(
+            args.data, backend, tokenizer.eos_token_id, args.max_seq_length, "train", args.eval_fraction, args.seed
+        )
+        eval_dataset = stream_tokenized(
+            args.data, backend, tokenizer.eos_token_id, args.max_seq_length, "eval", args.eval_fraction
+        )
+        print(f"Streaming {args.data}, holding out {args.eval_fraction:.1%} for eval")
+    else:
+        # Formatted and tokenized once, then memory-mapped from the cache
+        tokenized = load_tokenized(backend, tokenizer.eos_token_id, args.max_seq_length, "bucket", DATASET_PATH)
+        if args.batching == "bucket":
+            dataset = tokenized
+        else:
+            dataset = load_tokenized(backend, tokenizer.eos_token_id, args.max_seq_length, "pack", DATASET_PATH)
+        lengths = tokenized["length"]
+        efficiency = padding_report(lengths, args.max_seq_length, BATCH_SIZE)
+        print(
+            f"{len(lengths)} examples in {len(dataset)} rows; padding efficiency "
+            f"{efficiency[args.batching]:.1%} ({args.batching}) vs {efficiency['random']:.1%} (random batches)"
+        )
+    collator = DataCollator(tokenizer.pad_token_id)
 
     # 6. Training Arguments / SFT Config
     if SFTConfig:
@@ -103,7 +132,7 @@ def main():
         training_args = SFTConfig(
             output_dir=OUTPUT_DIR,
             num_train_epochs=3,
-            per_device_train_batch_size=2,
+            per_device_train_batch_size=BATCH_SIZE,
             gradient_accumulation_steps=4,
             optim="paged_adamw_32bit",
             save_steps=25,
@@ -113,30 +142,33 @@ def main():
             fp16=True,
             bf16=False,
             max_grad_norm=0.3,
-            max_steps=-1,
+            max_steps=args.max_steps,
             warmup_ratio=0.03,
-            group_by_length=True,
+            group_by_length=args.batching == "bucket",
+            remove_unused_columns=False,
             lr_scheduler_type="constant",
             report_to="none", # Changed from tensorboard to none to avoid error
             # max_seq_length=2048, # Removed to avoid errors
             # packing=False,       # Removed to avoid errors
+            dataset_kwargs={"skip_prepare_dataset": True},
         )
         
         # 7. Trainer
         trainer = SFTTrainer(
             model=model,
             train_dataset=dataset,
+            eval_dataset=eval_dataset,
             peft_config=peft_config,
             processing_class=tokenizer,
             args=training_args,
-            formatting_func=formatting_prompts_func,
+            data_collator=collator,
         )
     else:
         # Older trl versions
         training_args = TrainingArguments(
             output_dir=OUTPUT_DIR,
             num_train_epochs=3,
-            per_device_train_batch_size=2,
+            per_device_train_batch_size=BATCH_SIZE,
             gradient_accumulation_steps=4,
             optim="paged_adamw_32bit",
             save_steps=25,
@@ -146,9 +178,10 @@ def main():
             fp16=True,
             bf16=False,
             max_grad_norm=0.3,
-            max_steps=-1,
+            max_steps=args.max_steps,
             warmup_ratio=0.03,
-            group_by_length=True,
+            group_by_length=args.batching == "bucket",
+            remove_unused_columns=False,
             lr_scheduler_type="constant",
             report_to="none" # Changed from tensorboard to none
         )
@@ -157,16 +190,20 @@ def main():
         trainer = SFTTrainer(
             model=model,
             train_dataset=dataset,
+            eval_dataset=eval_dataset,
             peft_config=peft_config,
-            max_seq_length=2048,
+            max_seq_length=args.max_seq_length,
             tokenizer=tokenizer,
             args=training_args,
-            formatting_func=formatting_prompts_func,
+            data_collator=collator,
             packing=False,
+            dataset_kwargs={"skip_prepare_dataset": True},
         )
 
     print("Starting training...")
     trainer.train()
+    if eval_dataset is not None:
+        print(f"Held-out eval: {trainer.evaluate()}")
     
     print(f"Saving model to {OUTPUT_DIR}")
     trainer.model.save_pretrained(OUTPUT_DIR)
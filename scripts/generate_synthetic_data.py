@@ -1,17 +1,43 @@
 import os
 import json
 import glob
-from typing import List, Dict, Any
+import argparse
+import asyncio
+import hashlib
+import random
+import sys
+import time
+from typing import List, Dict, Any, Optional, Set, Tuple
 from langchain_openai import ChatOpenAI
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import SystemMessage, HumanMessage
+from dedup import DedupIndex, append_jsonl, iter_rows, repair_tail, truncate_rows
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+# The chat server's token counting (same tokenizer path, same fallback
+# estimate), so chunk budgets agree with the server's prompt budgets
+from core.tokens import count_tokens  # noqa: E402
 
 # Configuration
 RAW_DOCS_DIR = "data/raw_docs"
 OUTPUT_FILE = "data/dataset.jsonl"
+# One line per chunk already turned into Q&A pairs, so re-runs skip it
+JOURNAL_FILE = "data/dataset.journal.jsonl"
+# MinHash signature of every question in OUTPUT_FILE, in row order
+DEDUP_INDEX_FILE = "data/dataset.minhash.npy"
 VLLM_API_BASE = "http://localhost:8000/v1"
 MODEL_NAME = "/models/Meta-Llama-3.1-8B-Instruct"  # Use the model name the server knows
+# Long sections are split into chunks of about this many tokens
+CHUNK_TOKENS = 512
+CHUNK_OVERLAP_TOKENS = 50
+# Adjacent short sections of one document are sent together, up to this
+# many tokens of section text per generation call
+PACK_TOKEN_BUDGET = 1536
+MAX_SECTIONS_PER_CALL = 8
+# Completion tokens allowed per section in a packed call (3-5 Q&A pairs);
+# a call never gets less than the llm's own max_tokens
+RESPONSE_TOKENS_PER_SECTION = 768
 
 # Initialize LLM
 llm = ChatOpenAI(
@@ -23,8 +49,19 @@ llm = ChatOpenAI(
 )
 
 def load_json_docs(directory: str) -> List[Dict[str, Any]]:
-    """Load all JSON files from the directory and return list of doc objects."""
+    """
+    Load all JSON files from the directory and return list of doc objects.
+    JSONL files (one doc per line, as written by the ingestion CLI's
+    --output) are loaded too.
+    """
     docs = []
+    for file_path in glob.glob(os.path.join(directory, "*.jsonl")):
+        print(f"Loading {file_path}...")
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                docs.extend(json.loads(line) for line in f if line.strip())
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}")
     for file_path in glob.glob(os.path.join(directory, "*.json")):
         print(f"Loading {file_path}...")
         try:
@@ -39,17 +76,12 @@ def load_json_docs(directory: str) -> List[Dict[str, Any]]:
             print(f"Error reading {file_path}: {e}")
     return docs
 
-def generate_qa_pairs(doc: Dict[str, Any]) -> List[dict]:
-    """Ask the LLM to generate Q&A pairs from a document object."""
-    
+def build_qa_prompt(doc: Dict[str, Any]):
+    """Build the chat messages asking for Q&A pairs about a document object."""
     doc_title = doc.get('doc_title', 'Unknown Document')
     section = doc.get('section', 'General')
-    page = doc.get('page', 'N/A')
     text = doc.get('text', '')
 
-    if not text.strip():
-        return []
-        
     prompt = ChatPromptTemplate.from_messages([
         SystemMessage(content=(
             "You are an expert dataset creator. Your task is to create high-quality "
@@ -77,35 +109,289 @@ def generate_qa_pairs(doc: Dict[str, Any]) -> List[dict]:
         Return ONLY the JSON list.
         """)
     ])
-    
+    return prompt.format_messages()
+
+def parse_qa_response(content: str) -> List[dict]:
+    """Extract the JSON list of Q&A pairs from a response; raises ValueError if malformed."""
+    content = content.strip()
+
+    # Basic cleanup to ensure we get just the JSON list
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+         content = content.split("```")[1].split("```")[0].strip()
+
+    data = json.loads(content)
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        raise ValueError("Expected a JSON list of objects")
+
+    # Add metadata to the training example if useful, or just standard instruction format
+    for item in data:
+        if 'input' not in item:
+            item['input'] = "" 
+            # Optional: You could put "Context: {doc_title}, Section {section}" into 'input'
+
+    return data
+
+def chunk_key(doc: Dict[str, Any]) -> str:
+    """Content hash identifying a chunk in the journal."""
+    identity = json.dumps(
+        [doc.get('doc_title'), doc.get('section'), doc.get('page'), doc.get('text', '')],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+def load_journal(path: str) -> Tuple[Set[str], Optional[int]]:
+    """
+    Keys of chunks that completed in earlier runs, and the dataset row count
+    recorded by the last of them (None for journals that predate it).
+    """
+    done = set()
+    committed_rows = None
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    done.add(entry["key"])
+                except (json.JSONDecodeError, KeyError):
+                    continue  # A torn last line from a crash; that chunk is redone
+                committed_rows = entry.get("rows", committed_rows)
+    return done, committed_rows
+
+def split_into_chunks(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Split documents longer than CHUNK_TOKENS into token-sized chunks; short
+    ones are kept whole. Each chunk records its token count as 'tokens'.
+    """
+    chunks = []
+    # One splitter for the whole run, measuring length in model tokens
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_TOKENS,
+        chunk_overlap=CHUNK_OVERLAP_TOKENS,
+        length_function=count_tokens,
+    )
+    for doc in docs:
+        text = doc.get('text', '')
+        if not text.strip():
+            continue
+        tokens = count_tokens(text)
+        pieces = splitter.split_text(text) if tokens > CHUNK_TOKENS else [text]
+        for piece in pieces:
+            sub_doc = doc.copy()
+            sub_doc['text'] = piece
+            sub_doc['tokens'] = tokens if len(pieces) == 1 else count_tokens(piece)
+            chunks.append(sub_doc)
+    return chunks
+
+def pack_chunks(chunks: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Group adjacent chunks of the same document into packs of at most
+    PACK_TOKEN_BUDGET tokens (and MAX_SECTIONS_PER_CALL chunks), each sent
+    as one generation call. A chunk over the budget gets a pack to itself.
+    """
+    packs: List[List[Dict[str, Any]]] = []
+    pack_tokens = 0
+    for chunk in chunks:
+        current = packs[-1] if packs else None
+        if (
+            current is not None
+            and current[0].get('doc_title') == chunk.get('doc_title')
+            and len(current) < MAX_SECTIONS_PER_CALL
+            and pack_tokens + chunk['tokens'] <= PACK_TOKEN_BUDGET
+        ):
+            current.append(chunk)
+            pack_tokens += chunk['tokens']
+        else:
+            packs.append([chunk])
+            pack_tokens = chunk['tokens']
+    return packs
+
+def build_packed_qa_prompt(pack: List[Dict[str, Any]]):
+    """Build the chat messages asking for Q&A pairs about each section of a pack."""
+    doc_title = pack[0].get('doc_title', 'Unknown Document')
+    sections = "\n\n".join(
+        f'<section id="{i}" name="{doc.get("section", "General")}">\n{doc.get("text", "")}\n</section>'
+        for i, doc in enumerate(pack, 1)
+    )
+    return [
+        SystemMessage(content=(
+            "You are an expert dataset creator. Your task is to create high-quality "
+            "instruction-response pairs for fine-tuning a Large Language Model."
+        )),
+        HumanMessage(content=f"""
+        Read the following sections from the document "{doc_title}":
+
+        {sections}
+
+        For EACH section, generate 3 to 5 distinct Question and Answer pairs based *only* on that section.
+
+        Guidelines:
+        1. Include the context of the document or section in the question if relevant (e.g., "According to [Title]...").
+        2. Questions should be specific and technical.
+        3. Answers should be detailed and directly supported by the section's text.
+
+        Format the output as a JSON object mapping each section id to its list of pairs:
+        {{
+            "1": [{{"instruction": "Question text", "output": "Answer text"}}],
+            "2": [...]
+        }}
+
+        Return ONLY the JSON object.
+        """),
+    ]
+
+def parse_packed_qa_response(content: str, sections: int) -> List[Optional[List[dict]]]:
+    """
+    Split a packed response back into per-section pair lists, in pack order.
+    A section missing from the response (or malformed) comes back as None.
+    """
+    content = content.strip()
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0].strip()
+
+    data = json.loads(content)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object keyed by section id")
+    results: List[Optional[List[dict]]] = []
+    for i in range(1, sections + 1):
+        pairs = data.get(str(i))
+        if isinstance(pairs, list) and pairs and all(isinstance(p, dict) for p in pairs):
+            for item in pairs:
+                item.setdefault('input', "")
+            results.append(pairs)
+        else:
+            results.append(None)
+    return results
+
+def source_of(doc: Dict[str, Any]) -> str:
+    """Where a pair came from, stored with it in the dataset."""
+    return f"{doc.get('doc_title', 'Unknown Document')} | {doc.get('section', 'General')} | page {doc.get('page', 'N/A')}"
+
+async def agenerate_pack(
+    pack: List[Dict[str, Any]], retries: int, timeout: float
+) -> List[Optional[List[dict]]]:
+    """
+    Generate Q&A pairs for every section of a pack in one call (a single
+    section uses the plain prompt), with retries: malformed JSON, timeouts
+    and API errors are retried with exponential backoff and jitter.
+
+    Returns each section's pairs in pack order, tagged with the section's
+    source; None for a section that got no valid pairs, so it isn't
+    journaled and a re-run retries it.
+    """
+    if len(pack) == 1:
+        messages = build_qa_prompt(pack[0])
+        parse = lambda content: [parse_qa_response(content)]
+    else:
+        messages = build_packed_qa_prompt(pack)
+        parse = lambda content: parse_packed_qa_response(content, len(pack))
+    max_tokens = max(llm.max_tokens, RESPONSE_TOKENS_PER_SECTION * len(pack))
+
+    results: List[Optional[List[dict]]] = [None] * len(pack)
+    for attempt in range(retries + 1):
+        try:
+            response = await asyncio.wait_for(llm.ainvoke(messages, max_tokens=max_tokens), timeout)
+            results = parse(response.content)
+            break
+        except Exception as e:  # malformed JSON, timeouts, API errors
+            if attempt == retries:
+                print(f"Giving up on {pack[0].get('doc_title', '')} ({len(pack)} sections): {e!r}")
+                break
+            await asyncio.sleep(min(30.0, 2 ** attempt) * (0.5 + random.random()))
+
+    for doc, pairs in zip(pack, results):
+        for item in pairs or []:
+            item['source'] = source_of(doc)
+    return results
+
+async def generate_all(
+    chunks: List[Dict[str, Any]], concurrency: int, retries: int, timeout: float
+) -> Dict[str, int]:
+    """
+    Generate Q&A for every chunk not already in the journal, packing short
+    adjacent sections into shared calls, with at most `concurrency` calls in
+    flight. Pairs whose question near-duplicates one already in the dataset
+    are dropped.
+
+    Each finished chunk's remaining pairs are appended to the dataset in one
+    write, then its key and the new dataset row count to the journal, which
+    commits the batch. A crash between the two writes leaves rows past the
+    last committed count; they are cut off on the next run and their chunk,
+    absent from the journal, is generated again, so no rows are lost or
+    doubled.
+    """
+    # Drop half-written lines from a crash before appending after them
+    for path in (OUTPUT_FILE, JOURNAL_FILE):
+        if repair_tail(path):
+            print(f"Removed a partial last line from {path}")
+    done_keys, committed_rows = load_journal(JOURNAL_FILE)
+    rows = sum(1 for _ in iter_rows(OUTPUT_FILE))
+    if committed_rows is not None and rows > committed_rows:
+        truncate_rows(OUTPUT_FILE, committed_rows)
+        print(f"Removed {rows - committed_rows} uncommitted rows from {OUTPUT_FILE}")
+        rows = committed_rows
+
+    index = DedupIndex(DEDUP_INDEX_FILE)
+    index.truncate(rows)
+    caught_up = index.sync(OUTPUT_FILE)
+    if caught_up:
+        print(f"Indexed {caught_up} dataset rows missing from {DEDUP_INDEX_FILE}")
+
+    pending = [c for c in chunks if chunk_key(c) not in done_keys]
+    packs = pack_chunks(pending)
+    print(
+        f"{len(chunks) - len(pending)} chunks already done (journal), "
+        f"{len(pending)} to generate in {len(packs)} calls."
+    )
+
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"chunks": 0, "failed": 0, "pairs": 0, "duplicates": 0}
+    start = time.monotonic()
+
+    async def run(pack: List[Dict[str, Any]]) -> None:
+        nonlocal rows
+        async with semaphore:
+            results = await agenerate_pack(pack, retries, timeout)
+        for chunk, pairs in zip(pack, results):
+            if pairs is None:
+                stats["failed"] += 1
+                continue
+            # No await between indexing and appending, so index rows stay in
+            # dataset row order
+            kept = [p for p in pairs if index.add_if_new(p.get("instruction", ""))]
+            append_jsonl(OUTPUT_FILE, kept)
+            rows += len(kept)
+            append_jsonl(JOURNAL_FILE, [{"key": chunk_key(chunk), "pairs": len(kept), "rows": rows}])
+            stats["chunks"] += 1
+            stats["pairs"] += len(kept)
+            stats["duplicates"] += len(pairs) - len(kept)
+        finished = stats["chunks"] + stats["failed"]
+        elapsed = time.monotonic() - start
+        eta = elapsed / finished * (len(pending) - finished)
+        print(
+            f"[{finished}/{len(pending)}] {stats['pairs']} pairs, {stats['duplicates']} duplicates, "
+            f"{stats['failed']} failed, "
+            f"{finished / elapsed:.2f} chunks/s, ETA {eta:.0f}s"
+        )
+
     try:
-        response = llm.invoke(prompt.format_messages())
-        content = response.content.strip()
-        
-        # Basic cleanup to ensure we get just the JSON list
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-             content = content.split("```")[1].split("```")[0].strip()
-             
-        data = json.loads(content)
-        
-        # Add metadata to the training example if useful, or just standard instruction format
-        for item in data:
-            if 'input' not in item:
-                item['input'] = "" 
-                # Optional: You could put "Context: {doc_title}, Section {section}" into 'input'
-                
-        return data
-    except json.JSONDecodeError:
-        print("Failed to parse JSON from LLM response.")
-        print("Raw response:", response.content)
-        return []
-    except Exception as e:
-        print(f"Error generating Q&A: {e}")
-        return []
+        await asyncio.gather(*(run(pack) for pack in packs))
+    finally:
+        index.save()
+    return stats
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Generate a synthetic Q&A dataset from data/raw_docs")
+    ap.add_argument("--concurrency", type=int, default=16, help="Generation requests in flight at once")
+    ap.add_argument("--retries", type=int, default=3, help="Retries per chunk on bad JSON, timeouts or errors")
+    ap.add_argument("--timeout", type=float, default=120.0, help="Seconds allowed per generation request")
+    return ap.parse_args()
 
 def main():
+    args = parse_args()
     print(f"Scanning {RAW_DOCS_DIR} for JSON documents...")
     
     # 1. Load Documents
@@ -127,32 +413,15 @@ def main():
 
     print(f"Loaded {len(docs)} document sections.")
 
-    # 2. Generate Q&A
-    new_examples = []
-    for i, doc in enumerate(docs):
-        print(f"Processing document {i+1}/{len(docs)}: {doc.get('doc_title', '')} - {doc.get('section', '')}...")
-        
-        # If text is too long, split it (simple splitter for now)
-        text = doc.get('text', '')
-        if len(text) > 4000:
-            splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-            chunks = splitter.split_text(text)
-            for chunk in chunks:
-                sub_doc = doc.copy()
-                sub_doc['text'] = chunk
-                pairs = generate_qa_pairs(sub_doc)
-                new_examples.extend(pairs)
-        else:
-            pairs = generate_qa_pairs(doc)
-            new_examples.extend(pairs)
-            
-        print(f"Generated {len(pairs)} pairs.")
-
-    # 3. Append to Dataset
-    print(f"Appending {len(new_examples)} new examples to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
-        for example in new_examples:
-            f.write(json.dumps(example) + "\n")
+    # 2. Generate Q&A, appending each chunk's pairs to the dataset as it completes
+    chunks = split_into_chunks(docs)
+    stats = asyncio.run(generate_all(chunks, args.concurrency, args.retries, args.timeout))
+    print(
+        f"Appended {stats['pairs']} new examples from {stats['chunks']} chunks to {OUTPUT_FILE} "
+        f"({stats['duplicates']} near-duplicates dropped)."
+    )
+    if stats["failed"]:
+        print(f"{stats['failed']} chunks failed; rerun to retry them.")
     
     print("Done!")
 
@@ -0,0 +1,152 @@
+"""
+Stand-in for vLLM's OpenAI-compatible API, for benchmarking the chat server
+without a GPU.
+
+Streams fake completions at a configurable rate:
+
+    python scripts/mock_vllm.py --port 8000 --tokens-per-second 40 --ttft 0.15
+
+then point the chat server at it (VLLM_API_BASE defaults to localhost:8000).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from quart import Quart, Response, request
+
+WORDS = (
+    "the STARS system tracks aircraft using radar and surveillance data from "
+    "FAA and DoD sources to support terminal air traffic control operations"
+).split()
+
+app = Quart(__name__)
+config = argparse.Namespace(
+    tokens_per_second=40.0, ttft=0.15, jitter=0.1, response_tokens=256
+)
+stats = {"requests": 0, "completed": 0, "aborted": 0, "tokens": 0}
+
+
+def _delay(mean: float) -> float:
+    return max(0.0, random.gauss(mean, mean * config.jitter))
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.get("/health")
+async def health():
+    return ""
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "stars-adapter", "object": "model"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions():
+    body = await request.get_json()
+    stats["requests"] += 1
+    model = body.get("model", "mock")
+    n_tokens = min(config.response_tokens, body.get("max_tokens") or config.response_tokens)
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body["messages"])
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    if not body.get("stream"):
+        await asyncio.sleep(_delay(config.ttft) + n_tokens / config.tokens_per_second)
+        stats["completed"] += 1
+        stats["tokens"] += n_tokens
+        text = " ".join(random.choice(WORDS) for _ in range(n_tokens))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "length",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": n_tokens,
+                "total_tokens": prompt_tokens + n_tokens,
+            },
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+    async def generate():
+        sent = 0
+        try:
+            await asyncio.sleep(_delay(config.ttft))
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for _ in range(n_tokens):
+                yield _chunk(completion_id, model, {"content": random.choice(WORDS) + " "})
+                sent += 1
+                await asyncio.sleep(_delay(1 / config.tokens_per_second))
+            yield _chunk(completion_id, model, {}, finish_reason="length")
+            if include_usage:
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": n_tokens,
+                    "total_tokens": prompt_tokens + n_tokens,
+                }
+                payload = {
+                    "id": completion_id, "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": model,
+                    "choices": [], "usage": usage,
+                }
+                yield f"data: {json.dumps(payload)}\n\n"
+            yield "data: [DONE]\n\n"
+            stats["completed"] += 1
+        except asyncio.CancelledError:
+            stats["aborted"] += 1
+            raise
+        finally:
+            stats["tokens"] += sent
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.timeout = None
+    return response
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Mock vLLM OpenAI-compatible server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--tokens-per-second", type=float, default=40.0,
+                    help="Decode rate of each stream")
+    ap.add_argument("--ttft", type=float, default=0.15,
+                    help="Mean delay before the first token, in seconds")
+    ap.add_argument("--jitter", type=float, default=0.1,
+                    help="Relative standard deviation applied to every delay")
+    ap.add_argument("--response-tokens", type=int, default=256,
+                    help="Tokens per completion (capped by the request's max_tokens)")
+    args = ap.parse_args()
+    vars(config).update(
+        tokens_per_second=args.tokens_per_second,
+        ttft=args.ttft,
+        jitter=args.jitter,
+        response_tokens=args.response_tokens,
+    )
+    app.run(host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Formats and tokenizes data/dataset.jsonl once for scripts/finetune.py.
+
+The tokenized dataset is cached on disk as Arrow and memory-mapped when it
+is loaded. The cache key is a hash of the dataset bytes, the tokenizer and
+the settings, so a rerun with the same inputs skips formatting and
+tokenization entirely. Examples can be batched two ways:
+
+  pack    bin-pack whole examples into rows of up to max_seq_length tokens
+          (best-fit decreasing, nothing is split); the collator flattens
+          each batch into one sequence whose position_ids restart at every
+          example, which flash_attention_2 reads as separate sequences
+  bucket  one example per row plus a "length" column, for the Trainer's
+          group_by_length sampler to batch similar lengths together
+
+For corpora too large to cache up front, `stream_tokenized` reads JSONL
+shards lazily instead. It shuffles through a bounded, seeded buffer and
+packs a window of examples at a time. A held-out eval split is taken by
+hashing each question, so it is streamed too and never materialized.
+
+Run on its own to build the cache and compare the padding efficiency of
+each mode (real tokens / tokens in padded batches):
+
+    python scripts/prepare_dataset.py --tokenizer /opt/models/Meta-Llama-3.1-8B-Instruct
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "dataset.jsonl")
+CACHE_DIR = os.path.join(PROJECT_ROOT, "data", "cache", "tokenized")
+# Bump whenever format_example or the token layout changes, so old caches miss
+FORMAT_VERSION = 1
+BATCHING_MODES = ("pack", "bucket")
+# Matches the Trainer's LengthGroupedSampler, for the padding report
+MEGABATCH_MULT = 50
+IGNORE_INDEX = -100
+PAD_TO_MULTIPLE_OF = 8
+# Streaming: share of examples held out for eval, examples buffered for
+# shuffling, and examples packed together at a time
+EVAL_FRACTION = 0.02
+SHUFFLE_BUFFER = 10_000
+PACK_BUFFER = 1_000
+
+
+def format_example(example: Dict[str, Any]) -> str:
+    """The instruction prompt the adapter is trained on."""
+    input_text = example.get("input") or ""
+    if input_text:
+        return (
+            f"### Instruction:\n{example['instruction']}\n\n### Input:\n{input_text}"
+            f"\n\n### Response:\n{example['output']}"
+        )
+    return f"### Instruction:\n{example['instruction']}\n\n### Response:\n{example['output']}"
+
+
+def load_tokenizer(path: str) -> Tuple[Any, int]:
+    """
+    A `tokenizers.Tokenizer` and its EOS token id, from a model directory
+    (tokenizer.json plus tokenizer_config.json) or a tokenizer.json file.
+    """
+    from tokenizers import Tokenizer
+
+    directory = path if os.path.isdir(path) else os.path.dirname(path)
+    tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json") if os.path.isdir(path) else path)
+    eos_token = "</s>"
+    config_path = os.path.join(directory, "tokenizer_config.json")
+    if os.path.exists(config_path):
+        with open(config_path, "r", encoding="utf-8") as f:
+            eos_token = json.load(f).get("eos_token", eos_token)
+        if isinstance(eos_token, dict):
+            eos_token = eos_token["content"]
+    eos_id = tokenizer.token_to_id(eos_token)
+    if eos_id is None:
+        raise ValueError(f"EOS token {eos_token!r} is not in the tokenizer vocabulary")
+    return tokenizer, eos_id
+
+
+def cache_key(dataset_path: str, tokenizer: Any, eos_id: int, max_seq_length: int) -> str:
+    digest = hashlib.sha256()
+    with open(dataset_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(tokenizer.to_str().encode("utf-8"))
+    digest.update(json.dumps([eos_id, max_seq_length, FORMAT_VERSION]).encode())
+    return digest.hexdigest()[:16]
+
+
+def tokenize_batch(
+    batch: Dict[str, List[Any]], tokenizer: Any, eos_id: int, max_seq_length: int
+) -> Dict[str, List[Any]]:
+    """Formats and tokenizes a batch of rows, ending each example in EOS."""
+    examples = [dict(zip(batch, row)) for row in zip(*batch.values())]
+    encodings = tokenizer.encode_batch([format_example(e) for e in examples])
+    input_ids = [encoding.ids[:max_seq_length - 1] + [eos_id] for encoding in encodings]
+    return {"input_ids": input_ids, "length": [len(ids) for ids in input_ids]}
+
+
+def pack_examples(lengths: Sequence[int], max_seq_length: int) -> List[List[int]]:
+    """
+    Groups example indices into rows of at most `max_seq_length` tokens,
+    longest first, each into the open row it fills most tightly.
+    """
+    bins: List[List[int]] = []
+    # free capacity -> rows with exactly that much room; capacities kept sorted
+    open_bins: Dict[int, List[int]] = defaultdict(list)
+    capacities: List[int] = []
+    for index in np.argsort(-np.asarray(lengths), kind="stable"):
+        need = int(lengths[index])
+        position = bisect_left(capacities, need)
+        if position == len(capacities):
+            row = len(bins)
+            bins.append([int(index)])
+            free = max_seq_length - need
+        else:
+            room = capacities[position]
+            row = open_bins[room].pop()
+            if not open_bins[room]:
+                del capacities[position]
+                del open_bins[room]
+            bins[row].append(int(index))
+            free = room - need
+        if free > 0:
+            if free not in open_bins:
+                insort(capacities, free)
+            open_bins[free].append(row)
+    return bins
+
+
+def _packed_rows(tokenized: Any, bins: List[List[int]]):
+    for row in bins:
+        examples = tokenized.select(row)["input_ids"]
+        yield {
+            "input_ids": [token for ids in examples for token in ids],
+            "seq_lengths": [len(ids) for ids in examples],
+        }
+
+
+def _build_cached(path: str, build) -> Any:
+    from datasets import load_from_disk
+
+    if not os.path.isdir(path):
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        dataset = build()
+        dataset.save_to_disk(tmp_path)
+        dataset.cleanup_cache_files()
+        os.replace(tmp_path, path)
+    return load_from_disk(path)
+
+
+def load_tokenized(
+    tokenizer: Any,
+    eos_id: int,
+    max_seq_length: int,
+    mode: str = "pack",
+    dataset_path: str = DATASET_PATH,
+    cache_dir: str = CACHE_DIR,
+) -> Any:
+    """
+    The training set as a memory-mapped `datasets.Dataset`: one example per
+    row with input_ids and length ("bucket"), or packed rows with input_ids
+    and seq_lengths ("pack"). Built on first use, then loaded from cache.
+    """
+    from datasets import load_dataset
+
+    if mode not in BATCHING_MODES:
+        raise ValueError(f"Unknown batching mode {mode!r}; expected one of {BATCHING_MODES}")
+    root = os.path.join(cache_dir, cache_key(dataset_path, tokenizer, eos_id, max_seq_length))
+    os.makedirs(root, exist_ok=True)
+
+    def build_tokenized():
+        raw = load_dataset("json", data_files=dataset_path, split="train")
+        return raw.map(
+            tokenize_batch,
+            batched=True,
+            remove_columns=raw.column_names,
+            fn_kwargs={"tokenizer": tokenizer, "eos_id": eos_id, "max_seq_length": max_seq_length},
+            desc="Tokenizing",
+        )
+
+    tokenized = _build_cached(os.path.join(root, "tokenized"), build_tokenized)
+    if mode == "bucket":
+        return tokenized
+
+    def build_packed():
+        from datasets import Dataset
+
+        bins = pack_examples(tokenized["length"], max_seq_length)
+        return Dataset.from_generator(_packed_rows, gen_kwargs={"tokenized": tokenized, "bins": bins})
+
+    return _build_cached(os.path.join(root, "packed"), build_packed)
+
+
+def expand_shards(patterns: Sequence[str]) -> List[str]:
+    """Sorted JSONL shard paths matched by files or glob patterns."""
+    shards = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        if not matches:
+            raise FileNotFoundError(f"No dataset shards match {pattern}")
+        shards.update(matches)
+    return sorted(shards)
+
+
+def is_eval_example(example: Dict[str, Any], eval_fraction: float) -> bool:
+    """
+    Held-out assignment from a hash of the question alone, so an example
+    stays on its side of the split however the shards are laid out or grow.
+    """
+    key = f"{example.get('instruction') or ''}\n{example.get('input') or ''}".encode("utf-8")
+    bucket = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+    return bucket < eval_fraction * (1 << 64)
+
+
+def pack_batch(batch: Dict[str, List[Any]], max_seq_length: int) -> Dict[str, List[Any]]:
+    """Packs a window of tokenized examples into rows, as `pack_examples` does."""
+    rows = [[batch["input_ids"][i] for i in row] for row in pack_examples(batch["length"], max_seq_length)]
+    return {
+        "input_ids": [[token for ids in row for token in ids] for row in rows],
+        "seq_lengths": [[len(ids) for ids in row] for row in rows],
+    }
+
+
+def stream_tokenized(
+    patterns: Sequence[str],
+    tokenizer: Any,
+    eos_id: int,
+    max_seq_length: int,
+    split: str = "train",
+    eval_fraction: float = EVAL_FRACTION,
+    seed: int = 0,
+    shuffle_buffer: int = SHUFFLE_BUFFER,
+    pack_buffer: int = PACK_BUFFER,
+) -> Any:
+    """
+    A `datasets.IterableDataset` of packed rows read lazily from the JSONL
+    shards matched by `patterns`, holding at most `shuffle_buffer` raw and
+    `pack_buffer` tokenized examples in memory.
+
+    The train split shuffles shard order and then examples through the
+    buffer, both seeded (the Trainer reseeds each epoch via set_epoch), so a
+    run is reproducible. The eval split is the `eval_fraction` of examples
+    picked by `is_eval_example`, in file order.
+    """
+    from datasets import load_dataset
+
+    if split not in ("train", "eval"):
+        raise ValueError(f"Unknown split {split!r}; expected 'train' or 'eval'")
+    held_out = split == "eval"
+    stream = load_dataset("json", data_files=expand_shards(patterns), split="train", streaming=True)
+    stream = stream.filter(lambda example: is_eval_example(example, eval_fraction) == held_out)
+    if not held_out:
+        stream = stream.shuffle(seed=seed, buffer_size=shuffle_buffer)
+    stream = stream.map(
+        tokenize_batch,
+        batched=True,
+        fn_kwargs={"tokenizer": tokenizer, "eos_id": eos_id, "max_seq_length": max_seq_length},
+    ).select_columns(["input_ids", "length"])
+    return stream.map(
+        pack_batch,
+        batched=True,
+        batch_size=pack_buffer,
+        remove_columns=["input_ids", "length"],
+        fn_kwargs={"max_seq_length": max_seq_length},
+    )
+
+
+def collate_arrays(
+    features: List[Dict[str, Any]], pad_id: int, pad_to_multiple_of: int = PAD_TO_MULTIPLE_OF
+) -> Dict[str, np.ndarray]:
+    """
+    Batches rows into model inputs.
+
+    Packed rows (with seq_lengths) are flattened into a single sequence with
+    no attention_mask: position_ids restart at each example, which is how
+    flash_attention_2 finds the example boundaries and keeps attention
+    within each one, and the label of each example's first token is masked
+    so no example is trained to continue the previous one. Other rows are
+    padded to the longest, with an attention_mask.
+    """
+    if any(f.get("seq_lengths") for f in features):
+        return _flatten(features, pad_id, pad_to_multiple_of)
+    longest = max(len(f["input_ids"]) for f in features)
+    width = -(-longest // pad_to_multiple_of) * pad_to_multiple_of
+    input_ids = np.full((len(features), width), pad_id, dtype=np.int64)
+    labels = np.full((len(features), width), IGNORE_INDEX, dtype=np.int64)
+    attention_mask = np.zeros((len(features), width), dtype=np.int64)
+    for row, feature in enumerate(features):
+        ids = feature["input_ids"]
+        input_ids[row, :len(ids)] = ids
+        labels[row, :len(ids)] = ids
+        attention_mask[row, :len(ids)] = 1
+    return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+def _flatten(features: List[Dict[str, Any]], pad_id: int, pad_to_multiple_of: int) -> Dict[str, np.ndarray]:
+    lengths = [n for f in features for n in (f.get("seq_lengths") or [len(f["input_ids"])])]
+    total = sum(lengths)
+    width = -(-total // pad_to_multiple_of) * pad_to_multiple_of
+    input_ids = np.full((1, width), pad_id, dtype=np.int64)
+    input_ids[0, :total] = [token for f in features for token in f["input_ids"]]
+    labels = np.full((1, width), IGNORE_INDEX, dtype=np.int64)
+    labels[0, :total] = input_ids[0, :total]
+    # Padding becomes one more sequence of its own, with no labels
+    position_ids = np.concatenate([np.arange(n) for n in lengths + [width - total]])[None, :]
+    starts = np.cumsum([0] + lengths[:-1])
+    labels[0, starts[1:]] = IGNORE_INDEX
+    return {"input_ids": input_ids, "labels": labels, "position_ids": position_ids}
+
+
+class DataCollator:
+    """`collate_arrays` as torch tensors, for the Trainer's data_collator."""
+
+    def __init__(self, pad_id: int, pad_to_multiple_of: int = PAD_TO_MULTIPLE_OF):
+        self.pad_id = pad_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features: List[Dict[str, Any]]) -> Dict[str, Any]:
+        import torch
+
+        arrays = collate_arrays(features, self.pad_id, self.pad_to_multiple_of)
+        return {name: torch.from_numpy(array) for name, array in arrays.items()}
+
+
+def padding_efficiency(
+    row_lengths: Sequence[int], order: Sequence[int], batch_size: int, flattened: bool = False
+) -> float:
+    """
+    Real tokens over padded tokens when rows are batched in `order`, each
+    batch padded to its longest row or, if `flattened`, concatenated.
+    """
+    lengths = np.asarray(row_lengths)[np.asarray(order, dtype=np.int64)]
+    padded = 0
+    for start in range(0, len(lengths), batch_size):
+        batch = lengths[start:start + batch_size]
+        width = int(batch.sum()) if flattened else int(batch.max())
+        width = -(-width // PAD_TO_MULTIPLE_OF) * PAD_TO_MULTIPLE_OF
+        padded += width if flattened else width * len(batch)
+    return float(lengths.sum()) / padded if padded else 1.0
+
+
+def padding_report(lengths: Sequence[int], max_seq_length: int, batch_size: int, seed: int = 0) -> Dict[str, Any]:
+    """Padding efficiency of random batches, length-grouped batches and packed rows."""
+    lengths = np.asarray(lengths)
+    rng = np.random.default_rng(seed)
+    shuffled = rng.permutation(len(lengths))
+    # Like LengthGroupedSampler: shuffle, then sort within megabatches
+    megabatch = MEGABATCH_MULT * batch_size
+    grouped = np.concatenate([
+        sorted(shuffled[i:i + megabatch], key=lambda index: -lengths[index])
+        for i in range(0, len(shuffled), megabatch)
+    ]) if len(shuffled) else shuffled
+    packed = [int(lengths[row].sum()) for row in pack_examples(lengths, max_seq_length)]
+    return {
+        "random": padding_efficiency(lengths, shuffled, batch_size),
+        "bucket": padding_efficiency(lengths, grouped, batch_size),
+        "pack": padding_efficiency(packed, rng.permutation(len(packed)), batch_size, flattened=True),
+        "examples": len(lengths),
+        "packed_rows": len(packed),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tokenizer", required=True, help="Model directory or tokenizer.json")
+    ap.add_argument("--dataset", default=DATASET_PATH, help="JSONL of instruction/input/output rows")
+    ap.add_argument("--cache-dir", default=CACHE_DIR, help="Where tokenized datasets are cached")
+    ap.add_argument("--max-seq-length", type=int, default=2048, help="Longest row in tokens")
+    ap.add_argument("--batch-size", type=int, default=2, help="Per-device batch size for the report")
+    args = ap.parse_args()
+
+    tokenizer, eos_id = load_tokenizer(args.tokenizer)
+    tokenized = load_tokenized(tokenizer, eos_id, args.max_seq_length, "bucket", args.dataset, args.cache_dir)
+    load_tokenized(tokenizer, eos_id, args.max_seq_length, "pack", args.dataset, args.cache_dir)
+    report = padding_report(tokenized["length"], args.max_seq_length, args.batch_size)
+    print(f"{report['examples']} examples, {report['packed_rows']} packed rows")
+    for mode in ("random", "bucket", "pack"):
+        print(f"padding efficiency ({mode:<6}) {report[mode]:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
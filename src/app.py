@@ -1,31 +1,154 @@
-import os
-import json
+import time
+# Taken before the heavy imports below, so reported startup time includes them
+STARTED_AT = time.monotonic()
+import argparse
+import asyncio
 import logging
-from flask import Flask, send_from_directory, request, Response, stream_with_context
+from contextlib import aclosing
+from quart import Quart, send_from_directory, request, Response
+from core import metrics
 from core.conversation import session_manager
+from core.scheduler import AdmissionController, QueueFull
+from core.sse import coalesce, sse_event
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, static_folder=None)
+# Quart mirrors the Flask API but runs on asyncio (ASGI), so each open chat
+# stream is a coroutine rather than an OS thread.
+# `python app.py` serves with hypercorn (`--debug` for Quart's reloader); for
+# several workers use the ASGI server directly, e.g.
+# `hypercorn app:app --bind 0.0.0.0:5000 -w 4`.
+app = Quart(__name__, static_folder=None)
+
+# Admission control: generations beyond MAX_ACTIVE_STREAMS wait in a bounded
+# queue (shared fairly between sessions); past that, requests get a 429.
+# Size MAX_ACTIVE_STREAMS to what vLLM can decode without every stream slowing.
+MAX_ACTIVE_STREAMS = 128
+MAX_QUEUED_REQUESTS = 512
+MAX_QUEUED_PER_SESSION = 2
+# Slots one session may hold at once, so it can't starve everyone else
+MAX_ACTIVE_PER_SESSION = 2
+# SSE framing: tokens after the first are sent in batches, flushed every
+# SSE_FLUSH_INTERVAL seconds or SSE_FLUSH_TOKENS tokens, whichever is first.
+SSE_FLUSH_INTERVAL = 0.02
+SSE_FLUSH_TOKENS = 16
+
+admission = AdmissionController(
+    max_active=MAX_ACTIVE_STREAMS,
+    max_queued=MAX_QUEUED_REQUESTS,
+    max_queued_per_session=MAX_QUEUED_PER_SESSION,
+    max_active_per_session=MAX_ACTIVE_PER_SESSION,
+)
+
+# Values already tracked by the components are read at scrape time only
+metrics.gauge_callback(
+    "polaris_active_streams", "Chat streams currently generating", lambda: admission.active
+)
+metrics.gauge_callback(
+    "polaris_queued_requests", "Chat requests waiting for a slot", lambda: admission.queued
+)
+metrics.counter_callback(
+    "polaris_rejected_requests_total", "Chat requests refused with 429", lambda: admission.rejected
+)
+metrics.gauge_callback(
+    "polaris_active_sessions", "Sessions held in memory", lambda: len(session_manager.sessions)
+)
+metrics.gauge_callback(
+    "polaris_session_bytes", "Estimated size of sessions held in memory",
+    lambda: session_manager.sessions.total_bytes,
+)
+metrics.counter_callback(
+    "polaris_session_cache_hits_total", "Session lookups served from memory",
+    lambda: session_manager.sessions.hits,
+)
+metrics.counter_callback(
+    "polaris_session_cache_misses_total", "Session lookups not found in memory",
+    lambda: session_manager.sessions.misses,
+)
+metrics.counter_callback(
+    "polaris_session_evictions_total", "Sessions evicted from memory (LRU and idle TTL)",
+    lambda: session_manager.sessions.evictions_lru + session_manager.sessions.evictions_ttl,
+)
+metrics.gauge_callback(
+    "polaris_healthy_backends", "vLLM backends currently passing health checks",
+    lambda: sum(b.healthy for b in session_manager.pool.backends),
+)
+metrics.counter_callback(
+    "polaris_backend_failovers_total", "Sessions moved off an unhealthy vLLM backend",
+    lambda: session_manager.pool.failovers,
+)
+if session_manager.response_cache is not None:
+    cache = session_manager.response_cache
+    metrics.counter_callback(
+        "polaris_response_cache_hits_total", "Answers served from the response cache",
+        lambda: cache.exact_hits + cache.similar_hits,
+    )
+    metrics.counter_callback(
+        "polaris_response_cache_misses_total", "First-turn questions not in the response cache",
+        lambda: cache.misses,
+    )
+
+STARTUP_SECONDS = metrics.gauge(
+    "polaris_startup_seconds", "Time from process import to accepting traffic, including warm-up"
+)
+
+@app.before_serving
+async def warm_up():
+    # Open connections to vLLM and load the model before the first real
+    # request pays for it
+    warm_up_seconds = await session_manager.warm_up()
+    startup_seconds = time.monotonic() - STARTED_AT
+    STARTUP_SECONDS.set(startup_seconds)
+    logger.info(
+        f"Ready to serve after {startup_seconds:.2f}s "
+        f"(backend warm-up {warm_up_seconds:.2f}s)"
+    )
+
+@app.route("/metrics")
+async def metrics_endpoint():
+    return Response(
+        metrics.REGISTRY.render(),
+        mimetype="text/plain; version=0.0.4"
+    )
 
 @app.route("/chat")
-def chat_index():
-    return send_from_directory("web/chat", "index.html")
+async def chat_index():
+    return await send_from_directory("web/chat", "index.html")
 
 @app.route("/static/<path:filename>")
-def chat_static(filename):
-    return send_from_directory("web/chat/static/", filename)
+async def chat_static(filename):
+    return await send_from_directory("web/chat/static/", filename)
 
 @app.route("/lib/<path:filename>")
-def lib(filename):
-    return send_from_directory("web/chat/lib/", filename)
+async def lib(filename):
+    return await send_from_directory("web/chat/lib/", filename)
+
+@app.route("/api/stats")
+async def stats():
+    return {
+        "admission": admission.stats(),
+        "sessions": session_manager.sessions.stats(),
+        "backends": session_manager.pool.stats(),
+        "response_cache": (
+            session_manager.response_cache.stats()
+            if session_manager.response_cache else None
+        ),
+    }
+
+@app.route("/api/session/<session_id>/prefix-cache")
+async def session_prefix_cache(session_id):
+    stats = session_manager.prefix_stats(session_id)
+    if stats is None:
+        return Response("Unknown session", status=404)
+    return stats
 
 @app.route("/api/chat", methods=["POST"])
-def chat_api():
+async def chat_api():
+    received_at = time.monotonic()
     try:
-        data = request.get_json()
+        data = await request.get_json()
         session_id = data.get("session_id")
         message = data.get("message")
 
@@ -37,128 +160,64 @@ def chat_api():
 
         logger.info(f"Received message for session {session_id}: {message}")
 
-        def generate_stream():
-            chain = session_manager.get_chain(session_id)
-            
-            # LangChain's stream method yields tokens directly
-            try:
-                for chunk in chain.stream({"input": message}):
-                    # chunk is a dictionary like {'response': 'token'} or just the token depending on chain type
-                    # For ConversationChain, it yields the full response incrementally if configured
-                    # But standard ChatOpenAI stream yields ChatGenerationChunk
-                    
-                    # Actually, ConversationChain.stream() yields the final output key by default.
-                    # Let's verify what `stream` yields. It usually yields the result dict.
-                    # To get token-by-token streaming with ConversationChain, we rely on the LLM's streaming.
-                    # However, chain.stream() waits for the full response in some versions.
-                    
-                    # Better approach for streaming with Memory:
-                    # We can use the chain.astream() or use callbacks.
-                    # But keeping it simple: chain.stream() works in newer LangChain.
-                    
-                    # Let's assume chain.stream() yields chunks of the response text.
-                    if isinstance(chunk, dict) and "response" in chunk:
-                         content = chunk["response"]
-                    elif isinstance(chunk, str):
-                         content = chunk
-                    else:
-                         content = str(chunk) # Fallback
-                    
-                    # If using ConversationChain with stream(), it might yield the FULL response at the end 
-                    # rather than tokens. 
-                    # To get tokens, we need to use a CallbackHandler or call the LLM directly with memory context.
-                    pass
-                
-                # REVISION: chain.stream() with ConversationChain is tricky.
-                # Let's use the LLM directly with memory loaded.
-                
-                memory_variables = chain.memory.load_memory_variables({})
-                history = memory_variables["history"]
-                
-                # Construct full prompt manually? No, that defeats the purpose.
-                
-                # Let's stick to the simplest standard LangChain streaming:
-                # chain.stream(...)
-                
-                for chunk in chain.stream(message):
-                    # The chunk from ConversationChain stream is typically the response dict
-                    # which might NOT be streaming token-by-token effectively without a callback.
-                    
-                    # Force token streaming:
-                    # We will use the `astream_events` or just use the callback approach if needed.
-                    # But let's try the direct stream first. 
-                    # Actually, `chain.stream` yields the final output.
-                    
-                    # WAIT. `ConversationChain` does NOT support token-by-token streaming via `.stream()` easily
-                    # because it buffers.
-                    
-                    # ALTERNATIVE: Use `RunnableWithMessageHistory` (modern LangChain) or manual handling.
-                    
-                    # Let's use a callback handler to capture the stream.
-                    pass
-
-            except Exception as e:
-                yield f"data: {json.dumps({'content': f'[Error: {str(e)}]'})}\n\n"
-
-        # RE-IMPLEMENTATION using a simpler streaming approach compatible with Flask
-        # We will use the chain's predict method but we need to stream tokens.
-        # We can pass a callback to the chain run.
-        
-        from langchain.callbacks import StreamingStdOutCallbackHandler
-        from langchain.callbacks.base import BaseCallbackHandler
-        from queue import Queue, Empty
-        from threading import Thread
-
-        class StreamCallback(BaseCallbackHandler):
-            def __init__(self, queue):
-                self.queue = queue
-
-            def on_llm_new_token(self, token: str, **kwargs):
-                self.queue.put(token)
-
-            def on_llm_end(self, *args, **kwargs):
-                self.queue.put(None)
-
-            def on_llm_error(self, error, **kwargs):
-                self.queue.put(None)
-
-        def generate_stream_thread():
-            q = Queue()
-            chain = session_manager.get_chain(session_id)
-            
-            # Run chain in separate thread
-            def run_chain():
+        try:
+            ticket = await admission.admit(session_id)
+        except QueueFull as e:
+            logger.warning(f"Rejecting message for session {session_id}: {e}")
+            return Response(
+                str(e),
+                status=429,
+                headers={"Retry-After": str(int(e.retry_after))}
+            )
+
+        async def generate_stream():
+            # If the client disconnects, Quart cancels or closes this generator;
+            # aclosing() propagates that to astream so the upstream is aborted.
+            # coalesce() is closed first, so its pending read of `tokens` is
+            # cancelled before astream itself is closed.
+            with ticket:
                 try:
-                    chain.predict(input=message, callbacks=[StreamCallback(q)])
+                    async with aclosing(session_manager.astream(session_id, message, received_at)) as tokens:
+                        async with aclosing(coalesce(tokens, SSE_FLUSH_INTERVAL, SSE_FLUSH_TOKENS)) as frames:
+                            async for text in frames:
+                                yield sse_event(text)
+                except GeneratorExit:
+                    # Being closed: yielding an error frame now would be a RuntimeError
+                    raise
                 except Exception as e:
                     logger.error(f"Chain error: {e}")
-                    q.put(f"[Error: {e}]")
-                    q.put(None)
+                    yield sse_event(f"[Error: {e}]")
 
-            thread = Thread(target=run_chain)
-            thread.start()
-
-            while True:
-                try:
-                    token = q.get(timeout=60)
-                    if token is None:
-                        break
-                    yield f"data: {json.dumps({'content': token})}\n\n"
-                except Empty:
-                    break
-
-        return Response(
-            stream_with_context(generate_stream_thread()),
+        response = Response(
+            generate_stream(),
             mimetype="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "X-Accel-Buffering": "no"
             }
         )
+        # Generation length is bounded by max_tokens, not wall time; don't let
+        # Quart's default 60s response timeout cut long answers short.
+        response.timeout = None
+        return response
 
     except Exception as e:
         logger.error(f"API Error: {e}")
         return Response(f"Internal Server Error: {e}", status=500)
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    parser = argparse.ArgumentParser(description="Polaris chat server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--debug", action="store_true", help="Quart's development server with reloader")
+    args = parser.parse_args()
+
+    if args.debug:
+        app.run(host=args.host, port=args.port, debug=True)
+    else:
+        from hypercorn.asyncio import serve
+        from hypercorn.config import Config
+
+        config = Config()
+        config.bind = [f"{args.host}:{args.port}"]
+        asyncio.run(serve(app, config))
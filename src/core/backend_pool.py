@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Dict, Generic, Iterator, List, Optional, TypeVar
+import httpx
+
+logger = logging.getLogger(__name__)
+
+C = TypeVar("C")
+
+
+class Backend(Generic[C]):
+    """One OpenAI-compatible endpoint and the client bound to it."""
+
+    __slots__ = ("base_url", "client", "healthy", "outstanding", "requests", "failures")
+
+    def __init__(self, base_url: str, client: C):
+        self.base_url = base_url
+        self.client = client
+        self.healthy = True
+        self.outstanding = 0
+        # Counters
+        self.requests = 0
+        self.failures = 0
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class BackendPool(Generic[C]):
+    """
+    A set of interchangeable inference backends (vLLM servers).
+
+    Requests go to the healthy backend with the fewest requests outstanding.
+    A session sticks to the backend it was first sent to, so its prompt
+    prefix stays in that server's KV cache; it only moves when the backend
+    goes unhealthy. When outstanding counts are level, the choice falls back
+    to a hash of the session id, so several app workers with no shared state
+    still send a new session to the same backend.
+
+    A backend is marked unhealthy as soon as a request to it fails to
+    connect, and healthy again once a request to it completes;
+    `run_health_checks` also polls every backend's `/models` to take it out
+    of rotation or bring it back.
+    """
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        make_client: Callable[[str], C],
+        health_interval: float = 5.0,
+        health_timeout: float = 2.0,
+    ):
+        if not base_urls:
+            raise ValueError("BackendPool needs at least one base URL")
+        self.backends: List[Backend[C]] = [
+            Backend(url.rstrip("/"), make_client(url)) for url in base_urls
+        ]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._health_task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.failovers = 0
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    @property
+    def primary(self) -> Backend[C]:
+        return self.backends[0]
+
+    def pick(self, session_id: str, pinned: Optional[Backend[C]] = None) -> Backend[C]:
+        """
+        The backend to serve `session_id`: `pinned` (its previous backend)
+        while that is healthy, else the least loaded healthy one.
+        """
+        if pinned is not None and pinned.healthy:
+            return pinned
+        candidates = [b for b in self.backends if b.healthy and b is not pinned]
+        if not candidates:
+            # Nothing looks healthy: try anyway rather than refuse outright
+            candidates = self.backends
+        chosen = min(candidates, key=lambda b: (b.outstanding, self._rank(session_id, b)))
+        if pinned is not None and chosen is not pinned:
+            self.failovers += 1
+            logger.warning(
+                f"Backend {pinned.base_url} is unhealthy; moving session {session_id}"
+            )
+        return chosen
+
+    @contextmanager
+    def track(self, backend: Backend[C]) -> Iterator[Backend[C]]:
+        """
+        Count a request against `backend` while it is in flight; one that
+        completes without raising marks the backend healthy.
+        """
+        backend.outstanding += 1
+        backend.requests += 1
+        try:
+            yield backend
+            self.mark_healthy(backend)
+        finally:
+            backend.outstanding -= 1
+
+    def mark_failed(self, backend: Backend[C], error: BaseException) -> None:
+        """Take `backend` out of rotation until a health check passes."""
+        backend.failures += 1
+        if backend.healthy:
+            backend.healthy = False
+            logger.warning(f"Backend {backend.base_url} marked unhealthy: {error}")
+
+    def mark_healthy(self, backend: Backend[C]) -> None:
+        if not backend.healthy:
+            backend.healthy = True
+            logger.warning(f"Backend {backend.base_url} is healthy")
+
+    def ensure_health_checks(self) -> None:
+        """
+        Start the background health checker (needs a running event loop).
+        It runs even for a single backend, which would otherwise stay marked
+        unhealthy after one failed request.
+        """
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self.run_health_checks())
+
+    async def run_health_checks(self) -> None:
+        async with httpx.AsyncClient(timeout=self.health_timeout) as client:
+            while True:
+                await asyncio.gather(*(self._check(client, b) for b in self.backends))
+                await asyncio.sleep(self.health_interval)
+
+    async def _check(self, client: httpx.AsyncClient, backend: Backend[C]) -> None:
+        try:
+            response = await client.get(f"{backend.base_url}/models")
+            healthy = response.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+        if healthy != backend.healthy:
+            logger.warning(
+                f"Backend {backend.base_url} is {'healthy' if healthy else 'unhealthy'}"
+            )
+        backend.healthy = healthy
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "failovers": self.failovers,
+            "backends": [b.stats() for b in self.backends],
+        }
+
+    @staticmethod
+    def _rank(session_id: str, backend: Backend[C]) -> int:
+        # Rendezvous hashing: every worker ranks backends the same way
+        return -zlib.crc32(f"{backend.base_url}|{session_id}".encode())
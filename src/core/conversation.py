@@ -1,6 +1,16 @@
-from typing import Dict
+import asyncio
+import logging
+import os
+import random
+import re
+import sys
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+import openai
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
 from langchain_openai import ChatOpenAI
-from langchain.memory import ConversationSummaryBufferMemory
 from langchain.chains import ConversationChain
 from langchain.prompts import (
     ChatPromptTemplate,
@@ -8,59 +18,605 @@ from langchain.prompts import (
     SystemMessagePromptTemplate,
     HumanMessagePromptTemplate,
 )
+from core import metrics
+from core.backend_pool import Backend, BackendPool
+from core.memory import DeferredSummaryBufferMemory
+from core.response_cache import ResponseCache
+from core.session_backend import (
+    NullSessionBackend,
+    SessionBackend,
+    SQLiteSessionBackend,
+    StoredSession,
+)
+from core.session_store import SessionStore
+from core.tokens import count_message_tokens, count_tokens, get_tokenizer
 
 # Configuration
 VLLM_API_BASE = "http://localhost:8000/v1"
+# vLLM servers to spread sessions across, comma-separated
+VLLM_API_BASES = os.environ.get("POLARIS_VLLM_BASES", VLLM_API_BASE).split(",")
 # Use the LoRA adapter name configured in the vLLM service
 MODEL_NAME = "stars-adapter"
 MAX_TOKEN_LIMIT = 2048
+MAX_RESPONSE_TOKENS = 1024
+# Summarization runs in the background after a turn, so the buffer may run
+# past MAX_TOKEN_LIMIT for a while. Once it is over by more than this, the
+# next request waits for the summary instead of sending a stale history.
+MAX_SUMMARY_LAG_TOKENS = 1024
+# Background summary calls allowed in flight at once, so a burst of long
+# conversations can't crowd out interactive generations on vLLM.
+MAX_CONCURRENT_SUMMARIES = 8
+# Keep the rendered prompt append-only between summaries so vLLM's automatic
+# prefix caching can reuse the KV cache of everything but the newest turn.
+# See DeferredSummaryBufferMemory for how folding works in this mode.
+PREFIX_STABLE_HISTORY = True
+SUMMARY_FOLD_TARGET = MAX_TOKEN_LIMIT // 2
+MAX_SUMMARY_TOKENS = 1024
+# Every open chat stream holds one upstream connection, so each backend's pool
+# must be sized for the number of concurrent streams rather than the httpx
+# default (100).
+MAX_UPSTREAM_CONNECTIONS = 4096
+# How often every backend's health is polled when there is more than one
+BACKEND_HEALTH_INTERVAL_SECONDS = 5.0
+
+# Session store limits. Sessions idle for longer than the TTL, or the least
+# recently used ones once either cap is exceeded, are dropped from memory.
+MAX_SESSIONS = 10_000
+MAX_SESSION_BYTES = 512 * 1024 * 1024
+SESSION_TTL_SECONDS = 60 * 60
+# Rough fixed cost of a chain + memory object, on top of its message text
+SESSION_OVERHEAD_BYTES = 4 * 1024
+MESSAGE_OVERHEAD_BYTES = 512
+
+# Opt-in answer cache for first-turn questions (exact and near-duplicate)
+RESPONSE_CACHE_ENABLED = os.environ.get("POLARIS_RESPONSE_CACHE") == "1"
+RESPONSE_CACHE_MAX_ENTRIES = 4096
+RESPONSE_CACHE_TTL_SECONDS = 24 * 60 * 60
+RESPONSE_CACHE_SIMILARITY = 0.9
+
+# Shared session storage. When set, conversations are persisted to this SQLite
+# file so several workers (e.g. `hypercorn -w 4`) can serve the same session.
+SESSION_DB_PATH = os.environ.get("POLARIS_SESSION_DB")
+
+# Chains don't log their prompts (verbose=False); instead this fraction of
+# requests has its full prompt logged, e.g. POLARIS_PROMPT_LOG_SAMPLE_RATE=0.01.
+PROMPT_LOG_SAMPLE_RATE = float(os.environ.get("POLARIS_PROMPT_LOG_SAMPLE_RATE", "0"))
+# Our own time per request before the model is called (session lookup and
+# prompt build, excluding any wait for a summary); requests over it are counted.
+REQUEST_OVERHEAD_BUDGET_SECONDS = 0.005
+
+logger = logging.getLogger(__name__)
+
+# Word-sized pieces used to replay a cached answer as a token stream
+_REPLAY_CHUNK = re.compile(r"\S+\s*|\s+")
+
+MEMORY_LOAD_SECONDS = metrics.histogram(
+    "polaris_memory_load_seconds",
+    "Time to load a session and build its prompt, including any wait for a summary",
+)
+REQUEST_OVERHEAD_OVER_BUDGET = metrics.counter(
+    "polaris_request_overhead_over_budget_total",
+    "Requests whose pre-generation overhead exceeded REQUEST_OVERHEAD_BUDGET_SECONDS",
+)
+SUMMARY_WAIT_SECONDS = metrics.histogram(
+    "polaris_summary_wait_seconds",
+    "Time requests spent blocked on a summary because it was too stale",
+)
+SUMMARIZATION_SECONDS = metrics.histogram(
+    "polaris_summarization_seconds", "Duration of background summarization calls"
+)
+TIME_TO_FIRST_TOKEN_SECONDS = metrics.histogram(
+    "polaris_time_to_first_token_seconds",
+    "Time from receiving a chat request to its first generated token",
+)
+INTER_TOKEN_SECONDS = metrics.histogram(
+    "polaris_inter_token_seconds",
+    "Gap between consecutive generated tokens",
+    metrics.TOKEN_LATENCY_BUCKETS,
+)
+TOKENS_PER_SECOND = metrics.histogram(
+    "polaris_tokens_per_second",
+    "Decode rate of each completed stream, after its first token",
+    metrics.RATE_BUCKETS,
+)
+STREAM_DURATION_SECONDS = metrics.histogram(
+    "polaris_stream_duration_seconds",
+    "Time from receiving a chat request to the end of its stream",
+)
+ABORTED_STREAMS = metrics.counter(
+    "polaris_aborted_streams_total", "Streams cut short by a client disconnect"
+)
+ABORT_TOKENS_SAVED = metrics.counter(
+    "polaris_abort_tokens_saved_total",
+    "Completion tokens (out of max_tokens) not generated thanks to aborts",
+)
+PROMPT_TOKENS_REUSED = metrics.counter(
+    "polaris_prompt_tokens_reused_total",
+    "Prompt tokens shared with the session's previous prompt (prefix-cacheable)",
+)
+PROMPT_TOKENS_RECOMPUTED = metrics.counter(
+    "polaris_prompt_tokens_recomputed_total",
+    "Prompt tokens not shared with the session's previous prompt",
+)
+
+class Session:
+    """A session's chain plus the backend version it was last synced to."""
+    __slots__ = (
+        "chain", "version", "persisting", "backend", "last_prompt",
+        "prompt_tokens_reused", "prompt_tokens_recomputed",
+    )
+
+    def __init__(self, chain: ConversationChain, version: Optional[int] = None):
+        self.chain = chain
+        self.version = version
+        # Write of the latest turn to the backend, while it is in flight
+        self.persisting: Optional[asyncio.Task] = None
+        # vLLM server holding this conversation's prefix in its KV cache
+        self.backend: Optional[Backend[ChatOpenAI]] = None
+        # Previous request's prompt, to measure how much of it the next one reuses
+        self.last_prompt: List[BaseMessage] = []
+        self.prompt_tokens_reused = 0
+        self.prompt_tokens_recomputed = 0
+
+    def account_prompt(self, messages: List[BaseMessage]) -> Dict[str, int]:
+        """
+        Split a prompt's tokens into the prefix shared with the previous
+        request (reusable from vLLM's prefix cache) and the rest.
+        """
+        shared = 0
+        for previous, current in zip(self.last_prompt, messages):
+            if previous.type != current.type or previous.content != current.content:
+                break
+            shared += 1
+        counts = [count_message_tokens(m) for m in messages]
+        reused, recomputed = sum(counts[:shared]), sum(counts[shared:])
+        # A summary that only had a segment appended still shares its start
+        if shared < min(len(self.last_prompt), len(messages)):
+            previous, current = self.last_prompt[shared], messages[shared]
+            if previous.type == current.type and current.content.startswith(previous.content):
+                partial = min(count_tokens(previous.content), counts[shared])
+                reused, recomputed = reused + partial, recomputed - partial
+        self.last_prompt = messages
+        self.prompt_tokens_reused += reused
+        self.prompt_tokens_recomputed += recomputed
+        return {"reused": reused, "recomputed": recomputed}
+
+    def prefix_stats(self) -> Dict[str, Any]:
+        total = self.prompt_tokens_reused + self.prompt_tokens_recomputed
+        return {
+            "prompt_tokens_reused": self.prompt_tokens_reused,
+            "prompt_tokens_recomputed": self.prompt_tokens_recomputed,
+            "prefix_reuse_ratio": self.prompt_tokens_reused / total if total else 0.0,
+        }
+
+def estimate_session_bytes(session: Session) -> int:
+    """Approximate resident size of a session's chain and its history."""
+    memory = session.chain.memory
+    size = SESSION_OVERHEAD_BYTES + sys.getsizeof(memory.moving_summary_buffer)
+    for message in memory.chat_memory.messages:
+        size += MESSAGE_OVERHEAD_BYTES + sys.getsizeof(message.content)
+    return size
 
 class SessionManager:
-    def __init__(self):
-        self.sessions: Dict[str, ConversationChain] = {}
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        max_bytes: int = MAX_SESSION_BYTES,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        backend: Optional[SessionBackend] = None,
+    ):
+        # In-process cache in front of the (optional) shared backend
+        self.sessions: SessionStore[Session] = SessionStore(
+            max_sessions=max_sessions,
+            max_bytes=max_bytes,
+            ttl_seconds=ttl_seconds,
+            size_of=estimate_session_bytes,
+        )
+        if backend is None:
+            backend = (
+                SQLiteSessionBackend(SESSION_DB_PATH)
+                if SESSION_DB_PATH else NullSessionBackend()
+            )
+        self.backend = backend
+
+        self.response_cache: Optional[ResponseCache] = (
+            ResponseCache(
+                max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+                similarity_threshold=RESPONSE_CACHE_SIMILARITY,
+            )
+            if RESPONSE_CACHE_ENABLED else None
+        )
+
+        # In-flight background summarizations, at most one per session
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+        self._summary_slots = asyncio.Semaphore(MAX_CONCURRENT_SUMMARIES)
         
-        # Initialize the LLM (shared across sessions to save resources, 
-        # though chains are per-session)
-        self.llm = ChatOpenAI(
+        # One LLM client per vLLM server, shared across sessions to save
+        # resources (chains are per-session); `llm` is the first one.
+        self.pool: BackendPool[ChatOpenAI] = BackendPool(
+            VLLM_API_BASES,
+            self._create_llm,
+            health_interval=BACKEND_HEALTH_INTERVAL_SECONDS,
+        )
+        self.llm = self.pool.primary.client
+
+        # Load the tokenizer now rather than on the first request
+        get_tokenizer()
+
+        # The prompt is stateless, so every session's chain shares one copy
+        self.prompt = ChatPromptTemplate.from_messages([
+            SystemMessagePromptTemplate.from_template(
+                "You are Polaris, an intelligent assistant. "
+                "Use the conversation history to provide relevant context."
+            ),
+            MessagesPlaceholder(variable_name="history"),
+            HumanMessagePromptTemplate.from_template("{input}")
+        ])
+
+    @staticmethod
+    def _create_llm(base_url: str) -> ChatOpenAI:
+        # A keep-alive connection pool per server
+        return ChatOpenAI(
             openai_api_key="EMPTY",
-            openai_api_base=VLLM_API_BASE,
+            openai_api_base=base_url,
             model_name=MODEL_NAME,
-            max_tokens=1024,
+            max_tokens=MAX_RESPONSE_TOKENS,
             temperature=0.7,
-            streaming=True
+            streaming=True,
+            # Final chunk carries usage, including vLLM's cached prompt tokens
+            # when it runs with --enable-prompt-tokens-details
+            stream_usage=True,
+            http_async_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=MAX_UPSTREAM_CONNECTIONS,
+                    max_keepalive_connections=MAX_UPSTREAM_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(60.0, read=None),
+            ),
         )
 
     def get_chain(self, session_id: str) -> ConversationChain:
         """
         Retrieve or create a ConversationChain for the given session_id.
+
+        Synchronous, so it queries the backend inline; request handlers go
+        through astream(), which keeps that I/O off the event loop.
+        """
+        session = self.sessions.get(session_id)
+        if self._is_stale(session, self.backend.version(session_id)):
+            session = self._session_from(self.backend.load(session_id))
+            self.sessions.put(session_id, session)
+        return session.chain
+
+    async def _get_session(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is not None and session.persisting is not None:
+            # Our own last turn (e.g. an aborted one) may still be on its way
+            # to the backend; let it land before comparing versions.
+            await asyncio.shield(session.persisting)
+        # Another worker may have advanced this conversation since we cached it
+        stored_version = await self._backend_call(self.backend.version, session_id)
+        if self._is_stale(session, stored_version):
+            stored = await self._backend_call(self.backend.load, session_id)
+            session = self._session_from(stored)
+            self.sessions.put(session_id, session)
+        return session
+
+    @staticmethod
+    def _is_stale(session: Optional[Session], stored_version: Optional[int]) -> bool:
+        return session is None or (
+            stored_version is not None and session.version != stored_version
+        )
+
+    def _session_from(self, stored: Optional[StoredSession]) -> Session:
+        chain = self._create_new_chain()
+        if stored is None:
+            return Session(chain)
+        messages = []
+        for seq, role, content in stored.messages:
+            message = HumanMessage(content=content) if role == "human" else AIMessage(content=content)
+            message.response_metadata["seq"] = seq
+            messages.append(message)
+        chain.memory.load_history(stored.summary, messages)
+        return Session(chain, stored.version)
+
+    async def _backend_call(self, method, *args):
+        """Call a backend method, in a worker thread if it does blocking I/O."""
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    def _save_turn(
+        self, session_id: str, session: Session, message: str, response: str,
+        summarize: bool = True,
+    ) -> asyncio.Task:
+        """
+        Add the turn to the session's memory now, and persist it (then
+        summarize, if asked) in a task, which is returned for awaiting.
+        """
+        memory = session.chain.memory
+        memory.save_context({"input": message}, {"response": response})
+        saved = memory.chat_memory.messages[-2:]
+        session.persisting = asyncio.create_task(
+            self._persist_turn(session_id, session, saved, summarize)
+        )
+        return session.persisting
+
+    async def _persist_turn(
+        self, session_id: str, session: Session, messages: List[BaseMessage],
+        summarize: bool,
+    ) -> None:
+        try:
+            version, first_seq = await self._backend_call(
+                self.backend.append_turn,
+                session_id, [(m.type, m.content) for m in messages],
+            )
+        except Exception as e:
+            logger.error(f"Saving turn for session {session_id} failed: {e}")
+            session.version = -1
+            return
+        finally:
+            if session.persisting is asyncio.current_task():
+                session.persisting = None
+        # Remember where each message is stored, so a fold can name exactly
+        # the rows it covers.
+        for i, m in enumerate(messages):
+            m.response_metadata["seq"] = first_seq + i
+        self._advance_version(session, version)
+        self.sessions.resize(session_id)
+        if summarize:
+            self._schedule_summary(session_id, session)
+
+    @staticmethod
+    def _advance_version(session: Session, version: Optional[int]) -> None:
+        # If some other worker wrote in between, our copy is missing its
+        # changes: leave the version mismatched so the next request reloads.
+        if version is not None and version == (session.version or 0) + 1:
+            session.version = version
+        else:
+            session.version = -1
+
+    def _schedule_summary(self, session_id: str, session: Session) -> Optional[asyncio.Task]:
+        """Start a background summarization for the session if it needs one."""
+        task = self._summary_tasks.get(session_id)
+        if task is None and session.chain.memory.needs_summary():
+            task = asyncio.create_task(self._summarize(session_id, session))
+            self._summary_tasks[session_id] = task
+            task.add_done_callback(lambda _: self._summary_tasks.pop(session_id, None))
+        return task
+
+    async def _summarize(self, session_id: str, session: Session) -> None:
+        memory = session.chain.memory
+        try:
+            async with self._summary_slots:
+                start = time.monotonic()
+                base_summary = memory.moving_summary_buffer
+                backend = session.backend = self.pool.pick(session_id, session.backend)
+                memory.llm = backend.client
+                with self.pool.track(backend):
+                    try:
+                        folded = await memory.asummarize()
+                    except openai.APIConnectionError as e:
+                        self.pool.mark_failed(backend, e)
+                        raise
+                SUMMARIZATION_SECONDS.observe(time.monotonic() - start)
+            if folded:
+                through_seq = folded[-1].response_metadata.get("seq")
+                if through_seq is None:
+                    # Folded a turn that never reached the backend
+                    session.version = -1
+                    return
+                # Rejected (None) if another worker folded this session first:
+                # ours is then out of date and the next request reloads it.
+                version = await self._backend_call(
+                    self.backend.fold_summary,
+                    session_id, base_summary, memory.moving_summary_buffer, through_seq,
+                )
+                self._advance_version(session, version)
+                self.sessions.resize(session_id)
+        except Exception as e:
+            logger.error(f"Summarization failed for session {session_id}: {e}")
+
+    async def _bound_summary_lag(self, session_id: str, session: Session) -> float:
+        """Wait for a summary if the history is too stale; returns the wait."""
+        memory = session.chain.memory
+        if memory.buffer_tokens() <= MAX_TOKEN_LIMIT + MAX_SUMMARY_LAG_TOKENS:
+            return 0.0
+        task = self._schedule_summary(session_id, session)
+        if task is None:
+            return 0.0
+        start = time.monotonic()
+        # shield: a client disconnect must not cancel the shared summary
+        await asyncio.shield(task)
+        waited = time.monotonic() - start
+        SUMMARY_WAIT_SECONDS.observe(waited)
+        return waited
+
+    async def warm_up(self) -> float:
+        """
+        Send a one-token request to every backend, so connections are open
+        and the model is loaded before real traffic arrives. Returns the time
+        taken; unreachable backends are marked unhealthy rather than fatal.
+        """
+        start = time.monotonic()
+        self.pool.ensure_health_checks()
+
+        async def ping(backend: Backend[ChatOpenAI]) -> None:
+            try:
+                await backend.client.ainvoke([HumanMessage(content="Hi")], max_tokens=1)
+            except Exception as e:
+                self.pool.mark_failed(backend, e)
+
+        await asyncio.gather(*(ping(b) for b in self.pool.backends))
+        return time.monotonic() - start
+
+    def prefix_stats(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Prompt tokens reused vs recomputed so far for a cached session."""
+        session = self.sessions.peek(session_id)
+        return session.prefix_stats() if session else None
+
+    async def astream(
+        self, session_id: str, message: str, received_at: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the assistant's reply to `message` token by token.
+
+        Tokens are pulled straight from the LLM's async stream, so at most one
+        chunk per request is buffered server-side and a slow client applies
+        backpressure all the way to the upstream connection. The completed turn
+        is saved to the session's memory once the stream is exhausted, and any
+        summarization it calls for runs in the background after that.
+
+        If the consumer goes away mid-stream (the client disconnected), the
+        upstream request is closed immediately so vLLM aborts generation, and
+        the partial turn is kept in history (unless nothing was generated yet,
+        in which case the turn is not saved at all).
+
+        With the response cache enabled, a history-free question that matches
+        a cached one is answered from the cache without calling the LLM.
+
+        `received_at` (time.monotonic()) is when the request arrived, so that
+        latency metrics include time spent queued before this call.
+        """
+        start = time.monotonic()
+        if received_at is None:
+            received_at = start
+        session = await self._get_session(session_id)
+        chain = session.chain
+        cacheable = (
+            self.response_cache is not None
+            and not chain.memory.chat_memory.messages
+            and not chain.memory.moving_summary_buffer
+        )
+        if cacheable:
+            cached = self.response_cache.get(message)
+            if cached is not None:
+                logger.info(f"Answering session {session_id} from the response cache")
+                await self._save_turn(session_id, session, message, cached)
+                for piece in _REPLAY_CHUNK.findall(cached):
+                    yield piece
+                return
+
+        summary_wait = await self._bound_summary_lag(session_id, session)
+        memory_variables = await chain.memory.aload_memory_variables({})
+        messages = chain.prompt.format_messages(
+            history=memory_variables["history"], input=message
+        )
+        prefix = session.account_prompt(messages)
+        loaded = time.monotonic() - start
+        MEMORY_LOAD_SECONDS.observe(loaded)
+        if loaded - summary_wait > REQUEST_OVERHEAD_BUDGET_SECONDS:
+            REQUEST_OVERHEAD_OVER_BUDGET.inc()
+        if PROMPT_LOG_SAMPLE_RATE and random.random() < PROMPT_LOG_SAMPLE_RATE:
+            logger.info(f"Sampled prompt for session {session_id}: {messages}")
+
+        response = []
+        usage = None
+        first_token_at = last_token_at = None
+        try:
+            # aclosing() makes sure the HTTP stream to vLLM is closed as soon
+            # as we stop iterating, rather than whenever the generator is GC'd.
+            async with aclosing(self._generate(session_id, session, messages)) as stream:
+                async for chunk in stream:
+                    if chunk.content:
+                        now = time.monotonic()
+                        if last_token_at is None:
+                            first_token_at = now
+                            TIME_TO_FIRST_TOKEN_SECONDS.observe(now - received_at)
+                        else:
+                            INTER_TOKEN_SECONDS.observe(now - last_token_at)
+                        last_token_at = now
+                        response.append(chunk.content)
+                        yield chunk.content
+                    if chunk.usage_metadata:
+                        usage = chunk.usage_metadata
+        except (asyncio.CancelledError, GeneratorExit):
+            self._record_abort(session_id, len(response))
+            # Keep the partial turn, but leave summarizing it to the next
+            # completed turn rather than spending a call on an aborted one.
+            # Not awaited: we are being cancelled; the next request waits
+            # for it instead. A turn with no reply at all is dropped, since
+            # an empty AI message would only mislead later context.
+            if response:
+                self._save_turn(
+                    session_id, session, message, "".join(response), summarize=False
+                )
+            raise
+
+        end = time.monotonic()
+        STREAM_DURATION_SECONDS.observe(end - received_at)
+        if len(response) > 1:
+            TOKENS_PER_SECOND.observe((len(response) - 1) / max(last_token_at - first_token_at, 1e-6))
+
+        await self._save_turn(session_id, session, message, "".join(response))
+        if cacheable:
+            self.response_cache.put(message, "".join(response))
+        self._log_prefix_reuse(session_id, prefix, usage)
+
+    async def _generate(
+        self, session_id: str, session: Session, messages: List[BaseMessage]
+    ) -> AsyncIterator[AIMessageChunk]:
+        """
+        Stream a completion from the session's backend. If that backend can't
+        be reached before anything was streamed, the next one is tried.
         """
-        if session_id not in self.sessions:
-            self.sessions[session_id] = self._create_new_chain()
-        return self.sessions[session_id]
+        self.pool.ensure_health_checks()
+        for attempt in range(len(self.pool)):
+            backend = session.backend = self.pool.pick(session_id, session.backend)
+            streamed = False
+            try:
+                with self.pool.track(backend):
+                    async with aclosing(backend.client.astream(messages)) as stream:
+                        async for chunk in stream:
+                            streamed = True
+                            yield chunk
+                return
+            except openai.APIConnectionError as e:
+                self.pool.mark_failed(backend, e)
+                if streamed or attempt == len(self.pool) - 1:
+                    raise
+
+    def _log_prefix_reuse(self, session_id: str, prefix: Dict[str, int], usage: Optional[Dict[str, Any]]) -> None:
+        # vLLM's own figure is authoritative when reported; our estimate
+        # assumes everything shared with the previous prompt was still cached.
+        cached = (usage or {}).get("input_token_details", {}).get("cache_read")
+        PROMPT_TOKENS_REUSED.inc(prefix["reused"])
+        PROMPT_TOKENS_RECOMPUTED.inc(prefix["recomputed"])
+        logger.info(
+            f"Prompt for session {session_id}: {prefix['reused']} tokens reusable, "
+            f"{prefix['recomputed']} recomputed"
+            + (f" (vLLM reports {cached} of {usage['input_tokens']} cached)" if cached is not None else "")
+        )
+
+    def _record_abort(self, session_id: str, tokens_generated: int) -> None:
+        # Each streamed chunk carries one token, so whatever is left of the
+        # max_tokens budget is an upper bound on the decode work we skipped.
+        saved = max(MAX_RESPONSE_TOKENS - tokens_generated, 0)
+        ABORTED_STREAMS.inc()
+        ABORT_TOKENS_SAVED.inc(saved)
+        logger.info(
+            f"Client disconnected from session {session_id}; aborted generation "
+            f"after {tokens_generated} tokens (saved up to {saved}, "
+            f"{ABORT_TOKENS_SAVED.value:.0f} total across {ABORTED_STREAMS.value:.0f} aborts)"
+        )
 
     def _create_new_chain(self) -> ConversationChain:
         # Memory with summary buffer
-        memory = ConversationSummaryBufferMemory(
+        memory = DeferredSummaryBufferMemory(
             llm=self.llm,
             max_token_limit=MAX_TOKEN_LIMIT,
+            prefix_stable=PREFIX_STABLE_HISTORY,
+            fold_target=SUMMARY_FOLD_TARGET,
+            max_summary_tokens=MAX_SUMMARY_TOKENS,
             return_messages=True
         )
 
-        # Custom Prompt
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessagePromptTemplate.from_template(
-                "You are Polaris, an intelligent assistant. "
-                "Use the conversation history to provide relevant context."
-            ),
-            MessagesPlaceholder(variable_name="history"),
-            HumanMessagePromptTemplate.from_template("{input}")
-        ])
-
         return ConversationChain(
             llm=self.llm,
             memory=memory,
-            prompt=prompt,
-            verbose=True
+            prompt=self.prompt,
+            verbose=False
         )
 
 # Global instance
@@ -0,0 +1,92 @@
+from typing import Any, Dict, List
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from core.tokens import count_message_tokens, count_tokens
+
+
+class DeferredSummaryBufferMemory(ConversationSummaryBufferMemory):
+    """
+    Summary-buffer memory whose summarization is run by the caller, off the
+    request path.
+
+    Saving a turn only appends it to the buffer; the buffer may temporarily
+    exceed `max_token_limit` until `asummarize()` folds the overflow into the
+    running summary. `SessionManager` schedules that in the background after
+    each turn, and only waits for it when the lag passes its hard bound.
+
+    Token counts come from the served model's tokenizer, are computed once
+    per message, and are kept as a running total, so checking the buffer
+    size is O(1) rather than a re-tokenization of the whole history.
+
+    With `prefix_stable` set, the rendered history only ever changes at its
+    tail, which keeps vLLM's prefix cache warm across turns:
+
+    - overflow is folded down to `fold_target` tokens rather than to just
+      under the limit, so folds happen every few turns instead of every turn;
+    - each fold summarizes only the folded messages and *appends* the result
+      to the summary, leaving the text already sent to the model untouched;
+    - only once the summary itself exceeds `max_summary_tokens` is it
+      rewritten as a whole (one full prefill, then stable again).
+    """
+
+    buffer_token_count: int = 0
+    prefix_stable: bool = False
+    fold_target: int = 0
+    max_summary_tokens: int = 1024
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        input_str, output_str = self._get_input_output(inputs, outputs)
+        self._append([HumanMessage(content=input_str), AIMessage(content=output_str)])
+
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        self.save_context(inputs, outputs)
+
+    def load_history(self, summary: str, messages: List[BaseMessage]) -> None:
+        """Replace the summary and buffer, e.g. with a copy from storage."""
+        self.moving_summary_buffer = summary
+        self.chat_memory.messages = []
+        self.buffer_token_count = 0
+        self._append(messages)
+
+    def _append(self, messages: List[BaseMessage]) -> None:
+        self.buffer_token_count += sum(count_message_tokens(m) for m in messages)
+        self.chat_memory.add_messages(messages)
+
+    def buffer_tokens(self) -> int:
+        return self.buffer_token_count
+
+    def needs_summary(self) -> bool:
+        return self.buffer_token_count > self.max_token_limit
+
+    async def asummarize(self) -> List[BaseMessage]:
+        """
+        Fold the oldest buffered messages into the summary until the buffer
+        fits `max_token_limit` (or `fold_target` in prefix-stable mode).
+        Returns the messages folded.
+
+        Turns saved while the summary call is in flight are appended after
+        the folded messages, so they are left untouched.
+        """
+        if not self.needs_summary():
+            return []
+        target = self.fold_target if self.prefix_stable else self.max_token_limit
+        buffer = self.chat_memory.messages
+        folded = folded_tokens = 0
+        while self.buffer_token_count - folded_tokens > target and folded < len(buffer):
+            folded_tokens += count_message_tokens(buffer[folded])
+            folded += 1
+
+        if self.prefix_stable and count_tokens(self.moving_summary_buffer) < self.max_summary_tokens:
+            segment = await self.apredict_new_summary(buffer[:folded], "")
+            summary = "\n\n".join(s for s in (self.moving_summary_buffer, segment) if s)
+        else:
+            summary = await self.apredict_new_summary(
+                buffer[:folded], self.moving_summary_buffer
+            )
+        # Swap in the new summary and drop the folded messages together, with
+        # no await in between, so readers never see a half-applied update.
+        self.moving_summary_buffer = summary
+        folded_messages = buffer[:folded]
+        del buffer[:folded]
+        self.buffer_token_count -= folded_tokens
+        return folded_messages
@@ -0,0 +1,132 @@
+import bisect
+import math
+from typing import Callable, List, Sequence, Tuple
+
+# Default buckets (seconds) for request-scale latencies
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Finer buckets for per-token gaps
+TOKEN_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.035, 0.05, 0.075, 0.1, 0.25, 0.5, 1)
+RATE_BUCKETS = (1, 5, 10, 20, 30, 40, 60, 80, 100, 150, 200, 400)
+
+Sample = Tuple[str, float]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, self.value)]
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, self.value)]
+
+
+class CallbackMetric:
+    """A gauge or counter whose value is read from `fn` at scrape time."""
+
+    def __init__(self, kind: str, name: str, help: str, fn: Callable[[], float]):
+        self.kind, self.name, self.help, self._fn = kind, name, help, fn
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, self._fn())]
+
+
+class Histogram:
+    """
+    Prometheus-style histogram. `observe` is a bisect plus two additions,
+    cheap enough to call once per streamed token; buckets are only made
+    cumulative when scraped.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        total = 0
+        for bound, count in zip(self.bounds + [math.inf], self.counts):
+            total += count
+            samples.append((f'{self.name}_bucket{{le="{_format_value(bound)}"}}', total))
+        samples.append((f"{self.name}_sum", self.sum))
+        samples.append((f"{self.name}_count", total))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name} {_format_value(value)}" for name, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str) -> Counter:
+    return REGISTRY.register(Counter(name, help))
+
+
+def gauge(name: str, help: str) -> Gauge:
+    return REGISTRY.register(Gauge(name, help))
+
+
+def histogram(name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, buckets))
+
+
+def gauge_callback(name: str, help: str, fn: Callable[[], float]) -> CallbackMetric:
+    return REGISTRY.register(CallbackMetric("gauge", name, help, fn))
+
+
+def counter_callback(name: str, help: str, fn: Callable[[], float]) -> CallbackMetric:
+    return REGISTRY.register(CallbackMetric("counter", name, help, fn))
@@ -0,0 +1,172 @@
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import numpy as np
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_ACRONYM = re.compile(r"\b[A-Z][A-Z0-9]+\b")
+# Words that can differ between two phrasings of the same question. Negations
+# ("not", "no", "never", "without", ...) are deliberately absent: they flip
+# the meaning while barely changing the text.
+_STOPWORDS = frozenset("""
+    a an the this that these those is are was were be been being am do does did
+    what which who whom whose how why when where can could would should will
+    shall may might must i me my we our you your it its of in on at to for from
+    by with about as into and or please tell explain describe mean means
+""".split())
+
+
+def normalize_question(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a question."""
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _acronyms(text: str) -> frozenset:
+    return frozenset(_ACRONYM.findall(text))
+
+
+def _content_words(key: str) -> frozenset:
+    """Words of a normalized question that carry its meaning, plural-folded."""
+    return frozenset(
+        word[:-1] if len(word) > 3 and word.endswith("s") else word
+        for word in key.split()
+        if word not in _STOPWORDS
+    )
+
+
+class _Entry:
+    __slots__ = ("answer", "created", "row", "acronyms", "words")
+
+    def __init__(
+        self, answer: str, created: float, row: int, acronyms: frozenset, words: frozenset
+    ):
+        self.answer = answer
+        self.created = created
+        self.row = row
+        self.acronyms = acronyms
+        self.words = words
+
+
+class ResponseCache:
+    """
+    Answer cache for history-free questions, keyed by normalized text.
+
+    Besides exact matches, near-duplicates ("what does STARS stand for" vs
+    "what does STARS stand for?" or a reworded variant) are found by cosine
+    similarity over hashed character-trigram vectors. The vectors live in one
+    preallocated matrix, so a lookup is a single matrix-vector product over
+    every cached question. Lexical similarity can't tell "purpose of the TAMR
+    program" from "purpose of the STARS program", or "what does STARS stand
+    for" from "what does STARS not stand for", so a near-duplicate must also
+    name exactly the same acronyms and the same content words (everything but
+    stopwords, negations included) as the cached question. Similarity then
+    only absorbs differences in punctuation, filler words and plurals.
+
+    Entries expire after `ttl_seconds`, and the least recently used entry is
+    evicted once `max_entries` is reached.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        similarity_threshold: float,
+        dim: int = 2048,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.dim = dim
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._row_keys: list = [None] * max_entries
+        self._free_rows = list(range(max_entries - 1, -1, -1))
+
+        # Counters
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _vectorize(self, key: str) -> np.ndarray:
+        padded = f" {key} "
+        buckets = [
+            zlib.crc32(padded[i:i + 3].encode()) % self.dim
+            for i in range(len(padded) - 2)
+        ]
+        vector = np.bincount(buckets, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, question: str) -> Optional[str]:
+        key = normalize_question(question)
+        entry = self._live_entry(key)
+        if entry is not None:
+            self.exact_hits += 1
+            self._entries.move_to_end(key)
+            return entry.answer
+
+        if self._entries:
+            scores = self._vectors @ self._vectorize(key)
+            candidates = np.flatnonzero(scores >= self.similarity_threshold)
+            acronyms, words = _acronyms(question), _content_words(key)
+            # Best first: the closest match may fail the guards where a
+            # slightly less similar one passes.
+            for row in candidates[np.argsort(-scores[candidates], kind="stable")]:
+                match = self._row_keys[row]
+                entry = self._live_entry(match) if match is not None else None
+                if entry is not None and entry.acronyms == acronyms and entry.words == words:
+                    self.similar_hits += 1
+                    self._entries.move_to_end(match)
+                    return entry.answer
+
+        self.misses += 1
+        return None
+
+    def put(self, question: str, answer: str) -> None:
+        key = normalize_question(question)
+        if not key or not answer:
+            return
+        if key in self._entries:
+            self._remove(key)
+        if not self._free_rows:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        row = self._free_rows.pop()
+        self._vectors[row] = self._vectorize(key)
+        self._row_keys[row] = key
+        self._entries[key] = _Entry(
+            answer, self._clock(), row, _acronyms(question), _content_words(key)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _live_entry(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and self._clock() - entry.created > self.ttl_seconds:
+            self._remove(key)
+            self.evictions += 1
+            return None
+        return entry
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._vectors[entry.row] = 0.0
+        self._row_keys[entry.row] = None
+        self._free_rows.append(entry.row)
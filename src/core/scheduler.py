@@ -0,0 +1,201 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict
+from core import metrics
+
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    "polaris_queue_wait_seconds", "Time chat requests waited for a generation slot"
+)
+
+
+class QueueFull(Exception):
+    """Raised when a request can't even be queued; carries a retry hint."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many queued requests, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """
+    One admitted request's slot. Use as a context manager around the work;
+    release is idempotent, and a ticket that is dropped without being used
+    (e.g. the client left before the response body started) releases itself.
+    """
+
+    def __init__(
+        self, controller: "AdmissionController", session_id: str, wait_seconds: float
+    ):
+        self._controller = controller
+        self.session_id = session_id
+        self.wait_seconds = wait_seconds
+        self._start = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release(self.session_id, time.monotonic() - self._start)
+
+    def __enter__(self) -> "AdmissionTicket":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    def __del__(self):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Global cap on concurrent generations with a bounded, per-session fair
+    wait queue.
+
+    Waiting requests are grouped by session and slots are granted round-robin
+    across sessions, so a session with many queued requests gets one slot per
+    round rather than all of them. A session also holds at most
+    `max_active_per_session` slots at once; its further requests queue even
+    while other sessions' requests are admitted straight away. When the queue
+    (or a session's share of it) is full, `admit` fails fast with QueueFull
+    instead of waiting.
+    """
+
+    def __init__(
+        self,
+        max_active: int,
+        max_queued: int,
+        max_queued_per_session: int,
+        max_active_per_session: int,
+    ):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.max_queued_per_session = max_queued_per_session
+        self.max_active_per_session = max_active_per_session
+        self.active = 0
+        self.queued = 0
+        self._active_by_session: Dict[str, int] = {}
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {}
+        self._rotation: Deque[str] = deque()
+
+        # Counters
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        # Moving average of how long a slot is held, for Retry-After
+        self.avg_hold_seconds = 5.0
+
+    async def admit(self, session_id: str) -> AdmissionTicket:
+        """Wait for a slot; raises QueueFull if the request can't be queued."""
+        # Anyone still queued while a slot is free is held back by their own
+        # session's cap, so other sessions may go straight in.
+        if (
+            self.active < self.max_active
+            and session_id not in self._waiters
+            and self._session_has_room(session_id)
+        ):
+            self._activate(session_id)
+            return self._ticket(session_id, 0.0)
+
+        queue = self._waiters.get(session_id)
+        if self.queued >= self.max_queued or (
+            queue is not None and len(queue) >= self.max_queued_per_session
+        ):
+            self.rejected += 1
+            raise QueueFull(self.retry_after())
+
+        if queue is None:
+            queue = self._waiters[session_id] = deque()
+            self._rotation.append(session_id)
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        self.queued += 1
+        start = time.monotonic()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we were cancelled: hand it on
+                self._release(session_id, 0.0)
+            else:
+                self._remove_waiter(session_id, waiter)
+            raise
+        return self._ticket(session_id, time.monotonic() - start)
+
+    def retry_after(self) -> float:
+        """Rough time for the current queue to drain, in whole seconds."""
+        drain = self.avg_hold_seconds * (self.queued + 1) / max(self.max_active, 1)
+        return float(max(1, round(drain)))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_seconds": self.total_wait_seconds / self.admitted if self.admitted else 0.0,
+            "avg_hold_seconds": self.avg_hold_seconds,
+        }
+
+    def _ticket(self, session_id: str, wait_seconds: float) -> AdmissionTicket:
+        self.admitted += 1
+        self.total_wait_seconds += wait_seconds
+        QUEUE_WAIT_SECONDS.observe(wait_seconds)
+        return AdmissionTicket(self, session_id, wait_seconds)
+
+    def _session_has_room(self, session_id: str) -> bool:
+        return self._active_by_session.get(session_id, 0) < self.max_active_per_session
+
+    def _activate(self, session_id: str) -> None:
+        self.active += 1
+        self._active_by_session[session_id] = self._active_by_session.get(session_id, 0) + 1
+
+    def _release(self, session_id: str, held_seconds: float) -> None:
+        self.active -= 1
+        remaining = self._active_by_session[session_id] - 1
+        if remaining:
+            self._active_by_session[session_id] = remaining
+        else:
+            del self._active_by_session[session_id]
+        if held_seconds:
+            self.avg_hold_seconds += 0.1 * (held_seconds - self.avg_hold_seconds)
+        self._grant_next()
+
+    def _grant_next(self) -> None:
+        # Round-robin passes over the waiting sessions, skipping those at
+        # their cap, until the slots run out or a pass dequeues nothing.
+        progressed = True
+        while progressed and self.active < self.max_active and self._rotation:
+            progressed = False
+            for _ in range(len(self._rotation)):
+                if self.active >= self.max_active:
+                    break
+                session_id = self._rotation.popleft()
+                if not self._session_has_room(session_id):
+                    self._rotation.append(session_id)
+                    continue
+                queue = self._waiters[session_id]
+                waiter = queue.popleft()
+                self.queued -= 1
+                if queue:
+                    self._rotation.append(session_id)
+                else:
+                    del self._waiters[session_id]
+                progressed = True
+                if waiter.done():
+                    # Cancelled before its wake-up ran; its cleanup in admit()
+                    # finds it already dequeued, and the slot goes to the next
+                    continue
+                self._activate(session_id)
+                waiter.set_result(None)
+
+    def _remove_waiter(self, session_id: str, waiter: asyncio.Future) -> None:
+        queue = self._waiters.get(session_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self.queued -= 1
+        if not queue:
+            del self._waiters[session_id]
+            self._rotation.remove(session_id)
@@ -0,0 +1,225 @@
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# (role, content) pairs, where role is a LangChain message type: "human" or "ai"
+Turn = List[Tuple[str, str]]
+# (seq, role, content): a stored message and its position in the conversation
+StoredMessage = Tuple[int, str, str]
+
+
+@dataclass
+class StoredSession:
+    """Compact persisted form of a conversation: running summary + live buffer."""
+    summary: str = ""
+    messages: List[StoredMessage] = field(default_factory=list)
+    version: int = 0
+
+
+class SessionBackend(ABC):
+    """
+    Shared storage behind SessionManager, so any worker can serve any session.
+
+    Writes are incremental: each turn appends its messages, and each
+    summarization replaces the summary and drops the messages it folded in,
+    instead of rewriting the whole conversation.
+    """
+
+    # Whether calls do blocking I/O, so async callers should run them off
+    # the event loop
+    blocking = False
+
+    @abstractmethod
+    def version(self, session_id: str) -> Optional[int]:
+        """Cheap staleness check: the session's write counter, or None if unknown."""
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[StoredSession]:
+        """Return the stored session, or None if it has never been saved."""
+
+    @abstractmethod
+    def append_turn(self, session_id: str, messages: Turn) -> Tuple[int, int]:
+        """
+        Append `messages` to the session. Returns the session's new version
+        and the seq assigned to the first appended message.
+        """
+
+    @abstractmethod
+    def fold_summary(
+        self, session_id: str, base_summary: str, summary: str, through_seq: int
+    ) -> Optional[int]:
+        """
+        Replace the summary and drop the messages up to and including
+        `through_seq`, which it now covers. Returns the session's new version.
+
+        `summary` was computed from `base_summary`; if the stored summary is
+        no longer that (another worker folded first), nothing is written and
+        None is returned, so the caller can reload instead of losing turns.
+        """
+
+
+class NullSessionBackend(SessionBackend):
+    """Keeps nothing outside the process: single-worker deployments."""
+
+    def version(self, session_id: str) -> Optional[int]:
+        return None
+
+    def load(self, session_id: str) -> Optional[StoredSession]:
+        return None
+
+    def append_turn(self, session_id: str, messages: Turn) -> Tuple[int, int]:
+        return 0, 0
+
+    def fold_summary(
+        self, session_id: str, base_summary: str, summary: str, through_seq: int
+    ) -> Optional[int]:
+        return 0
+
+
+class _Rejected(Exception):
+    """Raised inside a write to roll it back without an error."""
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Local SQLite store in WAL mode, shared by all workers on one host.
+
+    WAL lets readers proceed while another worker writes, and every write is
+    a single short transaction appending rows under the session's key.
+    Calls block, so SessionManager runs them in a worker thread.
+    """
+
+    blocking = True
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            summary    TEXT    NOT NULL DEFAULT '',
+            next_seq   INTEGER NOT NULL DEFAULT 0,
+            version    INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL    NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            session_id TEXT    NOT NULL,
+            seq        INTEGER NOT NULL,
+            role       TEXT    NOT NULL,
+            content    TEXT    NOT NULL,
+            PRIMARY KEY (session_id, seq)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not be shared across a fork (gunicorn --preload),
+        # so each worker process opens its own on first use.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(
+                self.path, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(self._SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def version(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def load(self, session_id: str) -> Optional[StoredSession]:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN")
+            try:
+                row = conn.execute(
+                    "SELECT summary, version FROM sessions WHERE session_id = ?",
+                    (session_id,),
+                ).fetchone()
+                if row is None:
+                    return None
+                messages = conn.execute(
+                    "SELECT seq, role, content FROM messages WHERE session_id = ? ORDER BY seq",
+                    (session_id,),
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+        return StoredSession(summary=row[0], messages=messages, version=row[1])
+
+    def append_turn(self, session_id: str, messages: Turn) -> Tuple[int, int]:
+        first_seq = 0
+
+        def write(conn: sqlite3.Connection, summary: str, next_seq: int) -> int:
+            nonlocal first_seq
+            first_seq = next_seq
+            conn.executemany(
+                "INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [
+                    (session_id, next_seq + i, role, content)
+                    for i, (role, content) in enumerate(messages)
+                ],
+            )
+            return next_seq + len(messages)
+
+        return self._write(session_id, write), first_seq
+
+    def fold_summary(
+        self, session_id: str, base_summary: str, summary: str, through_seq: int
+    ) -> Optional[int]:
+        def write(conn: sqlite3.Connection, stored_summary: str, next_seq: int) -> int:
+            if stored_summary != base_summary:
+                raise _Rejected()
+            # Delete by seq rather than count, so turns appended by other
+            # workers since the summary was computed are never touched.
+            conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND seq <= ?",
+                (session_id, through_seq),
+            )
+            conn.execute(
+                "UPDATE sessions SET summary = ? WHERE session_id = ?",
+                (summary, session_id),
+            )
+            return next_seq
+
+        try:
+            return self._write(session_id, write)
+        except _Rejected:
+            return None
+
+    def _write(self, session_id: str, write) -> int:
+        """Run `write` in one transaction and bump the session's version."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR IGNORE INTO sessions (session_id, updated_at) VALUES (?, ?)",
+                    (session_id, time.time()),
+                )
+                summary, next_seq, version = conn.execute(
+                    "SELECT summary, next_seq, version FROM sessions WHERE session_id = ?",
+                    (session_id,),
+                ).fetchone()
+                next_seq = write(conn, summary, next_seq)
+                conn.execute(
+                    "UPDATE sessions SET next_seq = ?, version = ?, updated_at = ? "
+                    "WHERE session_id = ?",
+                    (next_seq, version + 1, time.time(), session_id),
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return version + 1
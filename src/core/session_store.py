@@ -0,0 +1,131 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class _Entry(Generic[V]):
+    __slots__ = ("value", "size", "last_access")
+
+    def __init__(self, value: V, size: int, last_access: float):
+        self.value = value
+        self.size = size
+        self.last_access = last_access
+
+
+class SessionStore(Generic[V]):
+    """
+    Bounded session_id -> value mapping with LRU and idle-TTL eviction.
+
+    Entries are kept in access order, so the least recently used entry is
+    also the one that has been idle longest. Both eviction policies therefore
+    only ever look at the head of the order: each call does O(1) work plus
+    O(1) per evicted entry, never a scan over all sessions.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        size_of: Callable[[V], int],
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._size_of = size_of
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry[V]]" = OrderedDict()
+        self.total_bytes = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions_lru = 0
+        self.evictions_ttl = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def get(self, session_id: str) -> Optional[V]:
+        """Return the session's value and mark it as most recently used."""
+        now = self._clock()
+        self._expire_idle(now)
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry.last_access = now
+        self._entries.move_to_end(session_id)
+        return entry.value
+
+    def peek(self, session_id: str) -> Optional[V]:
+        """Return the session's value without counting a hit or touching LRU order."""
+        entry = self._entries.get(session_id)
+        if entry is None or entry.last_access <= self._clock() - self.ttl_seconds:
+            return None
+        return entry.value
+
+    def put(self, session_id: str, value: V) -> None:
+        """Insert or replace a session, evicting others if over capacity."""
+        self.pop(session_id)
+        entry = _Entry(value, self._size_of(value), self._clock())
+        self._entries[session_id] = entry
+        self.total_bytes += entry.size
+        self._evict_over_capacity()
+
+    def resize(self, session_id: str) -> None:
+        """Re-estimate a session's size after its contents changed."""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        size = self._size_of(entry.value)
+        self.total_bytes += size - entry.size
+        entry.size = size
+        self._evict_over_capacity()
+
+    def pop(self, session_id: str) -> Optional[V]:
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return None
+        self.total_bytes -= entry.size
+        return entry.value
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions_lru": self.evictions_lru,
+            "evictions_ttl": self.evictions_ttl,
+        }
+
+    def _expire_idle(self, now: float) -> None:
+        deadline = now - self.ttl_seconds
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.last_access > deadline:
+                break
+            self._evict_oldest()
+            self.evictions_ttl += 1
+
+    def _evict_over_capacity(self) -> None:
+        # Always keep the most recently used session, even if it alone is
+        # over the byte cap, so a request never loses the session it is using.
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_sessions
+            or self.total_bytes > self.max_bytes
+        ):
+            self._evict_oldest()
+            self.evictions_lru += 1
+
+    def _evict_oldest(self) -> None:
+        _, entry = self._entries.popitem(last=False)
+        self.total_bytes -= entry.size
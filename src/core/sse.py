@@ -0,0 +1,67 @@
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional
+
+
+def sse_event(content: str) -> str:
+    """Frame a piece of the reply the way static/js/api.js expects it."""
+    return f"data: {json.dumps({'content': content})}\n\n"
+
+
+async def coalesce(
+    tokens: AsyncIterator[str], interval: float, max_tokens: int
+) -> AsyncIterator[str]:
+    """
+    Group a token stream into batches to cut per-token framing and writes.
+
+    The first token is passed through at once so time-to-first-token is not
+    affected. After that, a batch is flushed when it holds `max_tokens`
+    tokens or `interval` seconds after its first token arrived, whichever
+    comes first, even if the upstream stalls in between.
+    """
+    loop = asyncio.get_running_loop()
+    batch: List[str] = []
+    deadline = 0.0
+    first = True
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if not batch:
+                # Nothing to flush on a timer, so just wait for the next token
+                try:
+                    token = await (pending or tokens.__anext__())
+                except StopAsyncIteration:
+                    break
+                pending = None
+            else:
+                if pending is None:
+                    pending = asyncio.ensure_future(tokens.__anext__())
+                done, _ = await asyncio.wait({pending}, timeout=deadline - loop.time())
+                if not done:
+                    yield "".join(batch)
+                    batch = []
+                    continue
+                try:
+                    token = pending.result()
+                except StopAsyncIteration:
+                    break
+                pending = None
+
+            if first:
+                first = False
+                yield token
+                continue
+            if not batch:
+                deadline = loop.time() + interval
+            batch.append(token)
+            if len(batch) >= max_tokens:
+                yield "".join(batch)
+                batch = []
+        if batch:
+            yield "".join(batch)
+    finally:
+        # Don't leave the upstream generator running in an orphaned task:
+        # cancel it and wait, so its own cleanup (aborting vLLM) has run.
+        if pending is not None:
+            pending.cancel()
+            await asyncio.wait({pending})
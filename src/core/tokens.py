@@ -0,0 +1,58 @@
+import logging
+import os
+from functools import lru_cache
+from typing import Optional
+from langchain_core.messages import BaseMessage
+
+# Tokenizer of the model vLLM serves. The LoRA adapter reuses the base
+# model's vocabulary, so the base checkpoint's tokenizer.json is the right one.
+TOKENIZER_PATH = os.environ.get(
+    "POLARIS_TOKENIZER", "/opt/models/Meta-Llama-3.1-8B-Instruct"
+)
+# Llama 3 chat template wraps each message in
+# <|start_header_id|>{role}<|end_header_id|>\n\n ... <|eot_id|>
+MESSAGE_TOKEN_OVERHEAD = 5
+# Used only when the tokenizer can't be loaded (e.g. a dev box without the model)
+CHARS_PER_TOKEN = 4
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def get_tokenizer():
+    """Load the served model's tokenizer once per process (None if unavailable)."""
+    # The standalone `tokenizers` package reads tokenizer.json directly,
+    # without pulling in all of transformers.
+    try:
+        from tokenizers import Tokenizer
+        return Tokenizer.from_file(os.path.join(TOKENIZER_PATH, "tokenizer.json"))
+    except Exception as e:
+        logger.warning(
+            f"Could not load tokenizer from {TOKENIZER_PATH} ({e}); "
+            f"estimating {CHARS_PER_TOKEN} characters per token instead"
+        )
+        return None
+
+
+@lru_cache(maxsize=1024)
+def count_tokens(text: str) -> int:
+    # Cached because the system prompt and running summary are re-rendered
+    # for every request but rarely change.
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    """
+    Token count of a message as rendered by the chat template.
+
+    The count is computed once and cached in the message's response_metadata,
+    which is never sent back to the API.
+    """
+    cached: Optional[int] = message.response_metadata.get("token_count")
+    if cached is None:
+        cached = count_tokens(str(message.content)) + MESSAGE_TOKEN_OVERHEAD
+        message.response_metadata["token_count"] = cached
+    return cached
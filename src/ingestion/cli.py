@@ -1,14 +1,17 @@
 import argparse
 import sys
 import logging
+import multiprocessing
 from pathlib import Path
+from typing import Any, Iterator, List, Optional, Tuple
 
 # Google Standard: Use relative imports within the package.
 # This assumes the script is run as a module (e.g. `python -m src.core.ingestion.cli`)
 try:
+    # Processors are registered lazily, so this doesn't load any PDF library
     from .factory import ProcessorFactory
-    # Trigger registration by importing the processors package
-    from . import processors
+    from .sink import JsonlSink, to_records
+    from .incremental import ingest_batch
 except ImportError as e:
     # Helpful error if the user tries to run this file directly with `python cli.py`
     print("Error: This script must be run as a module from the project root.", file=sys.stderr)
@@ -20,6 +23,10 @@ except ImportError as e:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Pages per processor call: enough to amortize opening the PDF and setting up
+# a processor, few enough to keep checkpoints frequent and memory bounded
+DEFAULT_BLOCK_PAGES = 16
+
 def validate_args(data_path: Path, mode: str) -> None:
     """Validates command-line arguments and paths."""
     if not data_path.exists():
@@ -44,7 +51,9 @@ def parse_args() -> argparse.Namespace:
     ap.add_argument(
         "--data",
         required=True,
-        help="Path to input file."
+        nargs="+",
+        help="Path to input file. With --output-dir, any number of files, \
+                directories (searched for PDFs) and glob patterns."
     )
 
     ap.add_argument(
@@ -61,11 +70,171 @@ def parse_args() -> argparse.Namespace:
         type=str
     )
 
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes to split the page range across (default: 1). \
+                Each worker parses one contiguous block of pages.",
+    )
+
+    ap.add_argument(
+        "--output",
+        help="Stream extracted records to this JSONL file as pages finish, \
+                e.g. data/raw_docs/<name>.jsonl. A checkpoint is kept next to it.",
+    )
+
+    ap.add_argument(
+        "--resume",
+        action="store_true",
+        help="With --output, continue a killed run from its last completed page.",
+    )
+
+    ap.add_argument(
+        "--output-dir",
+        help="Batch mode: ingest every --data input into one JSONL file each in \
+                this directory, skipping files and pages unchanged since the last run.",
+    )
+
+    ap.add_argument(
+        "--block-pages",
+        type=int,
+        help=f"Pages parsed per processor call and, with --output, per checkpoint \
+                (default: {DEFAULT_BLOCK_PAGES}, or fewer so every worker gets a block).",
+    )
+
     return ap.parse_args()
 
+def get_page_count(data_path: Path) -> int:
+    """Returns the number of pages in a PDF without extracting any content."""
+    from .document import Document  # Loads PyMuPDF; only needed when sharding
+
+    with Document(data_path) as doc:
+        return len(doc)
+
+def shard_pages(start: int, end: int, shards: int) -> List[Tuple[int, int]]:
+    """
+    Splits the page range [start, end) into at most `shards` contiguous
+    (start, end) blocks of near-equal size, in page order.
+    """
+    shards = max(1, min(shards, end - start))
+    size, extra = divmod(end - start, shards)
+    blocks = []
+    for i in range(shards):
+        block_end = start + size + (1 if i < extra else 0)
+        blocks.append((start, block_end))
+        start = block_end
+    return blocks
+
+def _parse_shard(job: Tuple[str, Path, Tuple[int, int]]) -> Any:
+    """Worker entry point: parses one block of pages with a fresh processor."""
+    mode, data_path, page_nums = job
+    processor = ProcessorFactory.get_processor(mode)
+    return processor.parse(data_path, page_nums=page_nums)
+
+def merge_results(results: List[Any]) -> Any:
+    """
+    Combines per-shard results, given in page order. List results are
+    concatenated, so the output matches a single-process run; anything
+    else is returned as the list of per-shard results.
+    """
+    if all(isinstance(result, list) for result in results):
+        return [item for result in results for item in result]
+    return results
+
+def iter_blocks(
+    mode: str, data_path: Path, blocks: List[Tuple[int, int]], workers: int
+) -> Iterator[Tuple[Tuple[int, int], Any]]:
+    """
+    Parses each (start, end) block of pages and yields (block, result) in
+    block order. With more than one worker the blocks are spread over a
+    process pool, but are still yielded in order, so output is deterministic.
+    """
+    if not blocks:
+        return
+    if workers <= 1:
+        processor = ProcessorFactory.get_processor(mode)
+        for block in blocks:
+            yield block, processor.parse(data_path, page_nums=block)
+        return
+
+    jobs = [(mode, data_path, block) for block in blocks]
+    with multiprocessing.Pool(processes=min(workers, len(blocks))) as pool:
+        # imap yields in submission order, whichever block finishes first
+        yield from zip(blocks, pool.imap(_parse_shard, jobs))
+
+def parse_parallel(
+    mode: str, data_path: Path, start_page: int, end_page: int, workers: int
+) -> Any:
+    """
+    Parses pages [start_page, end_page) across a pool of `workers` processes.
+    Each worker opens the document once for its block, and blocks are
+    collected in page order, so the output is deterministic.
+    """
+    blocks = shard_pages(start_page, end_page, workers)
+    logger.info(f"Parsing pages {start_page}-{end_page} in {len(blocks)} blocks: {blocks}")
+    results = []
+    for block, result in iter_blocks(mode, data_path, blocks, workers):
+        logger.info(f"Pages {block[0]}-{block[1]} done")
+        results.append(result)
+    return merge_results(results)
+
+def stream_to_jsonl(
+    mode: str,
+    data_path: Path,
+    start_page: int,
+    end_page: int,
+    output_path: Path,
+    block_pages: Optional[int],
+    workers: int,
+    resume: bool,
+) -> int:
+    """
+    Parses pages [start_page, end_page) block by block and appends each
+    block's records to `output_path` as soon as it is parsed, so memory use
+    doesn't grow with the document. Returns the number of records written.
+    """
+    sink = JsonlSink(output_path, resume=resume)
+    if sink.next_page is not None:
+        logger.info(f"Resuming {output_path} from page {sink.next_page}")
+        start_page = max(start_page, sink.next_page)
+
+    if block_pages is None:
+        block_pages = min(DEFAULT_BLOCK_PAGES, -(-(end_page - start_page) // max(1, workers)))
+    block_pages = max(1, block_pages)
+    blocks = [
+        (page, min(page + block_pages, end_page))
+        for page in range(start_page, end_page, block_pages)
+    ]
+    written = 0
+    try:
+        for block, result in iter_blocks(mode, data_path, blocks, workers):
+            records = to_records(result, data_path.stem, block[0])
+            sink.write_block(records, next_page=block[1])
+            written += len(records)
+            logger.info(f"Pages {block[0]}-{block[1]}: {len(records)} records")
+    except BaseException:
+        sink.close()
+        raise
+    sink.finish()
+    return written
+
 def run_ingestion(args: argparse.Namespace) -> None:
-    data_path = Path(args.data)
     mode = args.mode
+    if args.output_dir:
+        logger.info(f"Starting batch ingestion of {args.data} into {args.output_dir}")
+        counts = ingest_batch(
+            mode, args.data, Path(args.output_dir), args.workers, iter_blocks,
+            args.block_pages or DEFAULT_BLOCK_PAGES,
+        )
+        logger.info(f"Batch ingestion complete: {counts}")
+        if counts["failed"]:
+            sys.exit(1)
+        return
+
+    if len(args.data) != 1:
+        raise ValueError("Multiple --data inputs require --output-dir")
+    data_path = Path(args.data[0])
 
     start_page, end_page = None, None
     if args.pages:
@@ -79,6 +248,23 @@ def run_ingestion(args: argparse.Namespace) -> None:
     logger.info(f"Starting ingestion for {mode} document: {data_path}")
     
     try:
+        if args.output:
+            if start_page is None or end_page is None:
+                start_page, end_page = 0, get_page_count(data_path)
+            written = stream_to_jsonl(
+                mode, data_path, start_page, end_page, Path(args.output),
+                args.block_pages, args.workers, args.resume,
+            )
+            logger.info(f"Ingestion complete. Wrote {written} records to {args.output}")
+            return
+
+        if args.workers > 1:
+            if start_page is None or end_page is None:
+                start_page, end_page = 0, get_page_count(data_path)
+            result = parse_parallel(mode, data_path, start_page, end_page, args.workers)
+            logger.info(f"Ingestion complete. Result: {result}")
+            return
+
         processor = ProcessorFactory.get_processor(mode)
         
         # Pass pages if available
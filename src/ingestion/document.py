@@ -0,0 +1,148 @@
+from collections import Counter
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import pymupdf as fitz
+
+from .utils import get_color_names
+
+class Page:
+    """
+    One page of a Document. Every feature is extracted on first access and
+    cached, so a processor only pays for what it uses, and the same text
+    dict feeds spans, fonts and colors instead of each re-reading the page.
+    """
+
+    def __init__(self, document: "Document", number: int):
+        self.document = document
+        self.number = number
+
+    @cached_property
+    def fitz_page(self) -> fitz.Page:
+        return self.document.fitz_doc[self.number]
+
+    @cached_property
+    def text_dict(self) -> Dict[str, Any]:
+        """PyMuPDF's structured text for the page (blocks > lines > spans)."""
+        return self.fitz_page.get_text("dict")
+
+    @cached_property
+    def spans(self) -> List[Dict[str, Any]]:
+        """
+        Text spans in reading order, each with text, font, size, flags,
+        bbox, packed RGB color and its palette name.
+        """
+        spans = [
+            {
+                "text": span["text"],
+                "font": span["font"],
+                "size": span["size"],
+                "flags": span["flags"],
+                "color": span["color"],
+                "bbox": tuple(span["bbox"]),
+                "block": block_number,
+            }
+            for block_number, block in enumerate(self.text_dict["blocks"])
+            if block.get("type") == 0  # text blocks; images are type 1
+            for line in block["lines"]
+            for span in line["spans"]
+        ]
+        for span, name in zip(spans, get_color_names(s["color"] for s in spans)):
+            span["color_name"] = name
+        return spans
+
+    @cached_property
+    def fonts(self) -> Counter:
+        """Characters of text per (font, size), e.g. to tell headings from body."""
+        counts: Counter = Counter()
+        for span in self.spans:
+            counts[(span["font"], round(span["size"], 1))] += len(span["text"])
+        return counts
+
+    @cached_property
+    def colors(self) -> Counter:
+        """Characters of text per palette color name."""
+        counts: Counter = Counter()
+        for span in self.spans:
+            counts[span["color_name"]] += len(span["text"])
+        return counts
+
+    @cached_property
+    def tables(self) -> List[Dict[str, Any]]:
+        """Table candidates found by PyMuPDF, as bbox plus extracted rows."""
+        return [
+            {"bbox": tuple(table.bbox), "rows": table.extract()}
+            for table in self.fitz_page.find_tables().tables
+        ]
+
+    @cached_property
+    def words(self) -> List[Dict[str, Any]]:
+        """
+        pdfplumber's word boxes for the page. Only this (and `plumber_page`)
+        open the file with pdfplumber, so processors that don't need it
+        never parse the PDF a second time.
+        """
+        return self.plumber_page.extract_words()
+
+    @cached_property
+    def plumber_page(self) -> Any:
+        return self.document.plumber_doc.pages[self.number]
+
+class Document:
+    """
+    A PDF opened once and shared by every feature extractor.
+
+    PyMuPDF is opened up front; pdfplumber only on first use by a page that
+    needs it. Use `iter_pages` to walk a range with bounded memory (each page
+    and its cached features are dropped once the caller moves on), or
+    `page(n)` for random access with caching.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.fitz_doc = fitz.open(self.path)
+        self._plumber_doc: Optional[Any] = None
+        self._pages: Dict[int, Page] = {}
+
+    def __enter__(self) -> "Document":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.fitz_doc.page_count
+
+    @property
+    def plumber_doc(self) -> Any:
+        if self._plumber_doc is None:
+            import pdfplumber  # Deferred: many processors never need it
+
+            self._plumber_doc = pdfplumber.open(self.path)
+        return self._plumber_doc
+
+    def page(self, number: int) -> Page:
+        """Returns page `number` (0-based), cached for later calls."""
+        if number not in self._pages:
+            self._pages[number] = Page(self, number)
+        return self._pages[number]
+
+    def iter_pages(self, page_nums: Optional[Tuple[int, int]] = None) -> Iterator[Page]:
+        """
+        Yields pages [start, end) (all pages by default), releasing each
+        page's cached features after the caller has moved past it.
+        """
+        start, end = page_nums if page_nums else (0, len(self))
+        for number in range(start, min(end, len(self))):
+            page = self._pages.pop(number, None) or Page(self, number)
+            yield page
+            if self._plumber_doc is not None and "plumber_page" in page.__dict__:
+                # pdfplumber caches parsed objects on its page until flushed
+                page.plumber_page.flush_cache()
+
+    def close(self) -> None:
+        self._pages.clear()
+        self.fitz_doc.close()
+        if self._plumber_doc is not None:
+            self._plumber_doc.close()
+            self._plumber_doc = None
@@ -7,23 +7,16 @@ try:
 except ImportError:
     from registry import get_processor_class, list_processors
 
-# CRITICAL: We must import the processors package to trigger the 
-# auto-discovery and registration of processor classes.
-try:
-    import processors 
-except ImportError:
-    # Handle case where it might be a relative import issue
-    try:
-        from . import processors
-    except ImportError:
-        pass # If this fails, the registry might be empty, which gets caught at runtime.
+# Processors are not imported here: the registry knows them by name and
+# imports each implementation (and its PDF libraries) on first use.
 
 logger = logging.getLogger(__name__)
 
 class ProcessorFactory:
     """
     Factory class to instantiate processors.
-    Now fully decoupled: it doesn't know about specific classes, only the registry.
+    Now fully decoupled: it doesn't know about specific classes, only the registry,
+    which imports a processor's module when it is first requested here.
     """
     
     @staticmethod
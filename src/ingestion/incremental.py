@@ -0,0 +1,257 @@
+import glob
+import hashlib
+import heapq
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .sink import to_records
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".manifest.json"
+_HASH_CHUNK_BYTES = 1 << 20
+
+# (mode, path, blocks, workers) -> (block, result) in block order; see cli.iter_blocks
+BlockParser = Callable[[str, Path, List[Tuple[int, int]], int], Iterable[Tuple[Tuple[int, int], Any]]]
+
+def expand_inputs(patterns: List[str], suffix: str = ".pdf") -> List[Path]:
+    """
+    Resolves files, directories (searched recursively for `suffix` files)
+    and glob patterns into a sorted, de-duplicated list of files.
+    """
+    paths = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            paths.update(p for p in path.rglob(f"*{suffix}") if p.is_file())
+        elif path.is_file():
+            paths.add(path)
+        else:
+            matches = [Path(p) for p in glob.glob(pattern, recursive=True)]
+            if not matches:
+                logger.warning(f"No files match {pattern}")
+            paths.update(p for p in matches if p.is_file())
+    return sorted(p.resolve() for p in paths)
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of the file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def page_digests(path: Path) -> List[str]:
+    """
+    SHA-256 of each page's content streams, so an edit to one page of a PDF
+    (even one that rewrites the whole file) only invalidates that page.
+    """
+    from .document import Document  # Loads PyMuPDF; only needed once a file has changed
+
+    with Document(path) as doc:
+        return [hashlib.sha256(page.fitz_page.read_contents()).hexdigest() for page in doc.iter_pages()]
+
+class Manifest:
+    """
+    On-disk record of what was ingested from each input file: its size,
+    mtime, content hash and per-page hashes. Saved atomically after every
+    file, so an interrupted batch keeps the progress it made.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, source: Path) -> Optional[Dict[str, Any]]:
+        return self.entries.get(str(source))
+
+    def update(self, source: Path, entry: Dict[str, Any]) -> None:
+        self.entries[str(source)] = entry
+        self.save()
+
+    def save(self) -> None:
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+def _output_path(source: Path, output_dir: Path) -> Path:
+    # Stem plus a short path hash, so same-named files in different folders don't collide
+    tag = hashlib.sha256(str(source).encode()).hexdigest()[:8]
+    return output_dir / f"{source.stem}-{tag}.jsonl"
+
+def _blocks(pages: List[int], block_pages: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Groups sorted page numbers into contiguous [start, end) blocks, of at
+    most `block_pages` pages each if given.
+    """
+    blocks: List[Tuple[int, int]] = []
+    for page in pages:
+        if blocks and blocks[-1][1] == page and (
+            block_pages is None or page - blocks[-1][0] < block_pages
+        ):
+            blocks[-1] = (blocks[-1][0], page + 1)
+        else:
+            blocks.append((page, page + 1))
+    return blocks
+
+def _kept_records(output: Path, keep: Callable[[int], bool]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Streams (pdf_page, record) from a previous output, for pages still valid."""
+    if not output.exists():
+        return
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                page = record.get("metadata", {}).get("pdf_page")
+                if page is not None and keep(page):
+                    yield page, record
+
+def _parsed_records(
+    mode: str,
+    source: Path,
+    pages: List[int],
+    workers: int,
+    block_pages: int,
+    parse_blocks: BlockParser,
+    coarse_blocks: List[Tuple[int, int]],
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Parses `pages` in contiguous blocks and streams (pdf_page, record) in
+    page order. A record is assigned to the page it reports as "page" when
+    that lies in its block; blocks with records that don't are appended to
+    `coarse_blocks`, their records going to the block's first page.
+    """
+    for (start, end), result in parse_blocks(mode, source, _blocks(pages, block_pages), workers):
+        records = []
+        # No default page, so records that don't report one can be told apart
+        for record in to_records(result, source.stem, None):
+            page = record["page"]
+            if record["page"] is None:
+                record["page"] = start
+            if not (isinstance(page, int) and start <= page < end):
+                page = start
+                if end - start > 1 and (start, end) not in coarse_blocks:
+                    coarse_blocks.append((start, end))
+            record["metadata"]["pdf_page"] = page
+            records.append((page, record))
+        records.sort(key=lambda item: item[0])
+        yield from records
+
+def ingest_file(
+    mode: str,
+    source: Path,
+    output_dir: Path,
+    manifest: Manifest,
+    workers: int,
+    parse_blocks: BlockParser,
+    block_pages: int,
+) -> str:
+    """
+    Brings `source`'s JSONL output up to date and returns what was done:
+    "unchanged", "new" or "updated (N/M pages)".
+
+    A file whose size and mtime match the manifest is skipped without being
+    read; one whose bytes hash the same is skipped after hashing. Otherwise
+    only pages whose content hash changed are re-parsed, in blocks of up to
+    `block_pages` pages, and their records are merged in page order with the
+    still-valid records of the previous output, streaming into a temporary
+    file that then replaces it.
+
+    If a processor's records for a block couldn't be told apart by page, the
+    manifest keeps that block as "coarse", and a change to any of its pages
+    re-parses all of them.
+    """
+    stat = source.stat()
+    entry = manifest.get(source)
+    output = _output_path(source, output_dir)
+    previous_ok = (
+        entry is not None and entry.get("mode") == mode and output.exists()
+    )
+    if previous_ok and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+        return "unchanged"
+
+    digest = file_digest(source)
+    if previous_ok and entry["sha256"] == digest:
+        manifest.update(source, {**entry, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+        return "unchanged"
+
+    pages = page_digests(source)
+    old_pages = entry["pages"] if previous_ok else []
+    changed = [
+        i for i, page_hash in enumerate(pages)
+        if i >= len(old_pages) or old_pages[i] != page_hash
+    ]
+    changed_set = set(changed)
+    old_coarse = [tuple(block) for block in entry.get("coarse_blocks", [])] if previous_ok else []
+    for start, end in old_coarse:
+        if changed_set.intersection(range(start, end)):
+            changed_set.update(range(start, min(end, len(pages))))
+    changed = sorted(changed_set)
+    coarse_blocks = [
+        block for block in old_coarse
+        if block[1] <= len(pages) and not changed_set.intersection(range(*block))
+    ]
+
+    tmp_output = output.with_name(output.name + ".tmp")
+    with open(tmp_output, "w", encoding="utf-8") as f:
+        kept = _kept_records(
+            output, lambda page: page < len(pages) and page not in changed_set
+        ) if previous_ok else iter(())
+        parsed = _parsed_records(mode, source, changed, workers, block_pages, parse_blocks, coarse_blocks)
+        # Both streams are in page order; merging keeps the file in page order
+        for _, record in heapq.merge(kept, parsed, key=lambda item: item[0]):
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_output, output)
+
+    manifest.update(source, {
+        "mode": mode,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest,
+        "pages": pages,
+        "coarse_blocks": sorted(coarse_blocks),
+        "output": str(output),
+    })
+    if not previous_ok:
+        return "new"
+    return f"updated ({len(changed)}/{len(pages)} pages, blocks {_blocks(changed)})"
+
+def ingest_batch(
+    mode: str,
+    patterns: List[str],
+    output_dir: Path,
+    workers: int,
+    parse_blocks: BlockParser,
+    block_pages: int,
+) -> Dict[str, int]:
+    """
+    Ingests every file matched by `patterns` into `output_dir`, one JSONL
+    file per input, skipping files and pages unchanged since the last run
+    (tracked in `output_dir`/.manifest.json). Returns counts per outcome.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(output_dir / MANIFEST_NAME)
+    counts = {"unchanged": 0, "new": 0, "updated": 0, "failed": 0}
+    for source in expand_inputs(patterns):
+        try:
+            outcome = ingest_file(
+                mode, source, output_dir, manifest, workers, parse_blocks, block_pages
+            )
+        except Exception as e:
+            logger.error(f"Failed to ingest {source}: {e}", exc_info=True)
+            counts["failed"] += 1
+            continue
+        logger.info(f"{source}: {outcome}")
+        counts[outcome.split(" ")[0]] += 1
+    return counts
@@ -1,23 +1,59 @@
-from typing import Type, Dict
-from processors.processor import Processor
+from importlib import import_module
+from typing import TYPE_CHECKING, Dict, Optional, Type
 
-_PROCESSOR_REGISTRY: Dict[str, Type[Processor]] = {}
+if TYPE_CHECKING:
+    from .processors.processor import Processor
+
+# Known processors as name -> "module:Class", resolved relative to this
+# package (or as top-level modules when this file is imported as a top-level
+# module, as factory.py's fallback does). Nothing is imported until a processor is actually requested, so
+# listing names (e.g. for --help) never loads the PDF libraries.
+_PROCESSOR_SPECS: Dict[str, str] = {
+    "IETP": ".processors.ietp:IETPProcessor",
+    "Reference_Card": ".processors.reference_card:ReferenceCardProcessor",
+}
+
+# Classes that have been imported, or registered directly with the decorator
+_PROCESSOR_REGISTRY: Dict[str, Type["Processor"]] = {}
 
 def register_processor(name: str):
     """
     Decorator to register a processor class with a specific name.
     """
-    def decorator(cls: Type[Processor]):
+    def decorator(cls: Type["Processor"]):
         _PROCESSOR_REGISTRY[name] = cls
         return cls
     return decorator
 
-def get_processor_class(name: str) -> Type[Processor]:
-    """Retrieves a processor class by name."""
-    return _PROCESSOR_REGISTRY.get(name)
+def register_lazy_processor(name: str, spec: str) -> None:
+    """Registers a processor by "module:Class" without importing it."""
+    _PROCESSOR_SPECS[name] = spec
+
+def get_processor_class(name: str) -> Optional[Type["Processor"]]:
+    """
+    Retrieves a processor class by name, importing its module on first use.
+    Returns None for unknown names; raises ImportError if a known processor
+    can't be loaded, rather than pretending it doesn't exist.
+    """
+    if name in _PROCESSOR_REGISTRY:
+        return _PROCESSOR_REGISTRY[name]
+    spec = _PROCESSOR_SPECS.get(name)
+    if spec is None:
+        return None
+    module_name, _, class_name = spec.partition(":")
+    try:
+        if module_name.startswith(".") and not __package__:
+            module = import_module(module_name.lstrip("."))
+        else:
+            module = import_module(module_name, package=__package__)
+        cls = getattr(module, class_name)
+    except (ImportError, AttributeError) as e:
+        raise ImportError(f"Processor {name!r} ({spec}) could not be loaded: {e}") from e
+    # The module may have registered itself with the decorator already
+    return _PROCESSOR_REGISTRY.setdefault(name, cls)
 
 def list_processors() -> list[str]:
     """Lists all registered processors."""
-    return list(_PROCESSOR_REGISTRY.keys())
+    return list(dict.fromkeys([*_PROCESSOR_SPECS, *_PROCESSOR_REGISTRY]))
 
 
@@ -0,0 +1,99 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+def to_records(result: Any, doc_title: str, page: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Normalizes a processor result for one block of pages into records of the
+    shape scripts/generate_synthetic_data.py reads:
+    {doc_title, section, page, text, metadata}.
+
+    Items may be dicts (known keys are lifted out, everything else goes into
+    `metadata`) or plain strings (taken as text). `page` is the first page of
+    the block and is used when an item doesn't carry its own.
+    """
+    if result is None:
+        return []
+    items = result if isinstance(result, (list, tuple)) else [result]
+    records = []
+    for item in items:
+        if isinstance(item, str):
+            item = {"text": item}
+        elif not isinstance(item, dict):
+            item = {"text": str(item)}
+        item = dict(item)
+        records.append({
+            "doc_title": item.pop("doc_title", doc_title),
+            "section": item.pop("section", "General"),
+            "page": item.pop("page", page),
+            "text": item.pop("text", ""),
+            "metadata": {**(item.pop("metadata", None) or {}), **item},
+        })
+    return records
+
+class JsonlSink:
+    """
+    Appends records to a JSONL file block by block, with a checkpoint so a
+    killed run can resume.
+
+    After each block the file is flushed and fsynced, then the checkpoint
+    (the next page to process and the file's byte length at that point) is
+    replaced atomically. On resume the file is truncated back to the
+    checkpointed length, which drops any records from a block that was only
+    partly written, so no page is ever written twice.
+    """
+
+    def __init__(self, path: Path, resume: bool = False):
+        self.path = Path(path)
+        self.checkpoint_path = self.path.with_name(self.path.name + ".checkpoint")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.next_page: Optional[int] = None
+
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint is not None:
+            self.next_page = checkpoint["next_page"]
+            self._file = open(self.path, "ab")
+            self._file.truncate(checkpoint["offset"])
+            self._file.seek(checkpoint["offset"])
+        else:
+            self._file = open(self.path, "wb")
+            self._clear_checkpoint()
+
+    def write_block(self, records: Iterable[Dict[str, Any]], next_page: int) -> None:
+        """Writes one block's records and records `next_page` as the resume point."""
+        self._file.write(b"".join(
+            json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+            for record in records
+        ))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.next_page = next_page
+        self._save_checkpoint({"next_page": next_page, "offset": self._file.tell()})
+
+    def finish(self) -> None:
+        """Closes the file; a complete run leaves no checkpoint behind."""
+        self._file.close()
+        self._clear_checkpoint()
+
+    def close(self) -> None:
+        """Closes the file, keeping the checkpoint for a later --resume."""
+        self._file.close()
+
+    def _load_checkpoint(self) -> Optional[Dict[str, int]]:
+        if not self.path.exists() or not self.checkpoint_path.exists():
+            return None
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_checkpoint(self, checkpoint: Dict[str, int]) -> None:
+        tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _clear_checkpoint(self) -> None:
+        if self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
@@ -1,38 +1,52 @@
 from pathlib import Path
 import pymupdf as fitz
-import pdfplumber
 import multiprocessing
 from PIL import Image
+from functools import lru_cache
+from typing import Iterable, List, Optional
+import numpy as np
 
+# Reference palette, in priority order: on equal distance the first entry wins
+_PALETTE_NAMES = (
+    "red", "green", "blue", "yellow", "cyan", "magenta", "white", "black", "gray",
+    "maroon", "navy", "olive", "teal", "purple", "aquamarine", "lime", "silver",
+)
+_PALETTE = np.array([
+    (255, 0, 0), (0, 128, 0), (0, 0, 255), (255, 255, 0), (0, 255, 255), (255, 0, 255),
+    (255, 255, 255), (0, 0, 0), (128, 128, 128), (128, 0, 0), (0, 0, 128), (128, 128, 0),
+    (0, 128, 128), (128, 0, 128), (127, 255, 212), (0, 255, 0), (192, 192, 192),
+], dtype=np.int64)
+_PALETTE_NAME_ARRAY = np.array(_PALETTE_NAMES, dtype=object)
+
+def _nearest_palette_names(colors: np.ndarray) -> np.ndarray:
+    """Names of the palette entries nearest to each packed 0xRRGGBB int."""
+    rgb = np.stack([(colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF], axis=1)
+    squared_distances = ((rgb[:, None, :] - _PALETTE[None, :, :]) ** 2).sum(axis=2)
+    # argmin picks the first of equal minima, matching the palette priority
+    return _PALETTE_NAME_ARRAY[squared_distances.argmin(axis=1)]
+
+@lru_cache(maxsize=4096)
 def get_color_name(color: int) -> str:
     """Returns the name of the closest color to the given"""
 
     if color is None:
         return "No Color"
+    return _nearest_palette_names(np.array([color], dtype=np.int64))[0]
 
-    # Extract the RGB Components from the integer
-    red = (color >> 16) & 0xFF
-    green = (color >> 8) & 0xFF
-    blue = color & 0xFF
-
-    rgb_tuple1 = (red, green, blue)
-
-    colors = {
-        "red": (255, 0, 0), "green": (0, 128, 0), "blue": (0, 0, 255),
-        "yellow": (255, 255, 0), "cyan": (0, 255, 255), "magenta": (255, 0, 255),
-        "white": (255, 255, 255), "black": (0, 0, 0), "gray": (128, 128, 128),
-        "maroon": (128, 0, 0), "navy": (0, 0, 128), "olive": (128, 128, 0),
-        "teal": (0, 128, 128), "purple": (128, 0, 128), "aquamarine": (127, 255, 212),
-        "lime": (0, 255, 0), "silver": (192, 192, 192)
-    }
-
-    min_distance = float('inf')
-    closest_color_name = "unknown"
-    r1, g1, b1 = rgb_tuple1
-    for name, rgb_tuple2 in colors.items():
-        r2, g2, b2 = rgb_tuple2
-        squared_distance = (r2 - r1)**2 + (g2 - g1)**2 + (b2 - b1)**2
-        if squared_distance < min_distance:
-            min_distance = squared_distance
-            closest_color_name = name
-    return closest_color_name
+def get_color_names(colors: Iterable[Optional[int]]) -> List[str]:
+    """
+    Batch form of get_color_name for many packed RGB ints (e.g. every span
+    color on a page). Each distinct color is classified once, with a single
+    vectorized distance computation against the palette; None gives "No Color".
+    """
+    colors = list(colors)
+    names = ["No Color"] * len(colors)
+    present = [i for i, color in enumerate(colors) if color is not None]
+    if not present:
+        return names
+    values = np.fromiter((colors[i] for i in present), dtype=np.int64, count=len(present))
+    # Span colors repeat heavily, so classify each distinct value only once
+    unique, inverse = np.unique(values, return_inverse=True)
+    for i, name in zip(present, _nearest_palette_names(unique)[inverse]):
+        names[i] = name
+    return names
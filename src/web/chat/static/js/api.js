@@ -23,12 +23,15 @@ export async function streamChat(sessionId, message, signal) {
 
     return {
         async *[Symbol.asyncIterator]() {
+            // A read() can end mid-line (or mid-character); keep the
+            // unfinished tail and prepend it to the next chunk.
+            let buffer = '';
             while (true) {
                 const { done, value } = await reader.read();
-                if (done) break;
+                buffer += done ? decoder.decode() : decoder.decode(value, { stream: true });
 
-                const chunk = decoder.decode(value);
-                const lines = chunk.split('\n');
+                const lines = buffer.split('\n');
+                buffer = done ? '' : lines.pop();
 
                 for (const line of lines) {
                     if (line.startsWith('data: ')) {
@@ -42,6 +45,8 @@ export async function streamChat(sessionId, message, signal) {
                         }
                     }
                 }
+
+                if (done) break;
             }
         }
     };
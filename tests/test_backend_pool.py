@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from core.backend_pool import BackendPool  # noqa: E402
+
+
+def make_pool(*urls):
+    return BackendPool(list(urls), make_client=lambda url: object())
+
+
+def test_single_backend_recovers_without_counting_a_failover():
+    pool = make_pool("http://a/v1")
+    backend = pool.primary
+    pool.mark_failed(backend, ConnectionError("refused"))
+    assert pool.pick("s", pinned=backend) is backend
+    assert pool.failovers == 0
+
+    with pool.track(backend):
+        pass
+    assert backend.healthy
+
+
+def test_failed_request_leaves_backend_unhealthy():
+    pool = make_pool("http://a/v1")
+    pool.mark_failed(pool.primary, ConnectionError("refused"))
+    try:
+        with pool.track(pool.primary):
+            raise ConnectionError("refused")
+    except ConnectionError:
+        pass
+    assert not pool.primary.healthy
+
+
+def test_failover_counted_only_when_the_session_moves():
+    pool = make_pool("http://a/v1", "http://b/v1")
+    pinned = pool.pick("s")
+    pool.mark_failed(pinned, ConnectionError("refused"))
+    moved = pool.pick("s", pinned=pinned)
+    assert moved is not pinned
+    assert pool.failovers == 1
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+fitz = pytest.importorskip("pymupdf")
+pytest.importorskip("PIL")
+
+from ingestion.document import Document  # noqa: E402
+from ingestion.incremental import page_digests  # noqa: E402
+
+
+def write_pdf(path, pages):
+    doc = fitz.open()
+    for text, color in pages:
+        page = doc.new_page()
+        page.insert_text((72, 72), text, fontsize=12, color=color)
+    doc.save(path)
+    doc.close()
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "doc.pdf"
+    write_pdf(path, [("Red heading", (1, 0, 0)), ("Blue body", (0, 0, 1)), ("Black text", (0, 0, 0))])
+    return path
+
+
+def test_page_features_share_one_text_extraction(pdf_path):
+    with Document(pdf_path) as doc:
+        page = doc.page(0)
+        assert [span["text"] for span in page.spans] == ["Red heading"]
+        assert page.spans[0]["color_name"] == "red"
+        assert page.colors == {"red": len("Red heading")}
+        assert sum(page.fonts.values()) == len("Red heading")
+        assert "text_dict" in page.__dict__ and doc.page(0) is page
+        assert doc._plumber_doc is None
+
+
+def test_iter_pages_releases_pages_and_opens_pdfplumber_lazily(pdf_path):
+    pytest.importorskip("pdfplumber")
+    with Document(pdf_path) as doc:
+        names = [page.spans[0]["color_name"] for page in doc.iter_pages((1, 10))]
+        assert names == ["blue", "black"]
+        assert doc._pages == {} and doc._plumber_doc is None
+        assert [w["text"] for w in doc.page(1).words] == ["Blue", "body"]
+        assert doc._plumber_doc is not None
+
+
+def test_page_digests_change_only_for_edited_pages(pdf_path, tmp_path):
+    edited = tmp_path / "edited.pdf"
+    write_pdf(edited, [("Red heading", (1, 0, 0)), ("Blue body, revised", (0, 0, 1)), ("Black text", (0, 0, 0))])
+    before, after = page_digests(pdf_path), page_digests(edited)
+    assert len(before) == 3
+    assert [a == b for a, b in zip(before, after)] == [True, False, True]
@@ -0,0 +1,147 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+pytest.importorskip("datasets")
+tokenizers = pytest.importorskip("tokenizers")
+
+import prepare_dataset  # noqa: E402
+from prepare_dataset import (  # noqa: E402
+    collate_arrays,
+    format_example,
+    is_eval_example,
+    load_tokenized,
+    pack_examples,
+    padding_report,
+    stream_tokenized,
+)
+
+ROWS = [
+    {"instruction": "What is STARS", "input": "", "output": "a terminal automation system"},
+    {"instruction": "What is TAMR", "input": "terminal program", "output": "a modernization program"},
+    {"instruction": "Who runs STARS", "input": "", "output": "the FAA and the DoD run it jointly across sites"},
+]
+
+
+def make_tokenizer():
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    words = {w for row in ROWS for text in row.values() for w in text.split()}
+    words |= {"###", "Instruction:", "Input:", "Response:"} | {str(i) for i in range(100)}
+    words = sorted(words)
+    vocab = {"[UNK]": 0, "</s>": 1, **{w: i + 2 for i, w in enumerate(words)}}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    return tokenizer
+
+
+@pytest.fixture
+def dataset_path(tmp_path):
+    path = tmp_path / "dataset.jsonl"
+    path.write_text("".join(json.dumps(row) + "\n" for row in ROWS), encoding="utf-8")
+    return str(path)
+
+
+def test_format_example_includes_input_only_when_present():
+    assert "### Input:" not in format_example(ROWS[0])
+    assert "### Input:\nterminal program\n\n### Response:" in format_example(ROWS[1])
+
+
+def test_tokenized_rows_end_in_eos_and_are_cached(dataset_path, tmp_path, monkeypatch):
+    tokenizer = make_tokenizer()
+    cache_dir = str(tmp_path / "cache")
+    tokenized = load_tokenized(tokenizer, 1, 64, "bucket", dataset_path, cache_dir)
+    assert tokenized["length"] == [len(ids) for ids in tokenized["input_ids"]]
+    assert all(ids[-1] == 1 and 0 not in ids for ids in tokenized["input_ids"])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("re-tokenized despite a cache hit")
+
+    monkeypatch.setattr(prepare_dataset, "tokenize_batch", fail)
+    assert load_tokenized(tokenizer, 1, 64, "bucket", dataset_path, cache_dir)["input_ids"] == tokenized["input_ids"]
+
+
+def test_packed_rows_hold_whole_examples(dataset_path, tmp_path):
+    tokenizer = make_tokenizer()
+    cache_dir = str(tmp_path / "cache")
+    lengths = load_tokenized(tokenizer, 1, 32, "bucket", dataset_path, cache_dir)["length"]
+    packed = load_tokenized(tokenizer, 1, 32, "pack", dataset_path, cache_dir)
+    assert sorted(n for row in packed["seq_lengths"] for n in row) == sorted(lengths)
+    assert all(len(ids) == sum(n) <= 32 for ids, n in zip(packed["input_ids"], packed["seq_lengths"]))
+
+
+def test_pack_examples_is_tight_and_respects_the_limit():
+    lengths = [7, 3, 5, 5, 2, 8, 1]
+    bins = pack_examples(lengths, 10)
+    assert sorted(i for row in bins for i in row) == list(range(len(lengths)))
+    assert all(sum(lengths[i] for i in row) <= 10 for row in bins)
+    assert len(bins) == 4  # 31 tokens need at least 4 rows of 10
+
+
+def test_collate_flattens_packed_rows():
+    batch = collate_arrays(
+        [{"input_ids": [5, 6, 7, 8, 9], "seq_lengths": [2, 3]}, {"input_ids": [4, 3], "seq_lengths": [2]}],
+        pad_id=1,
+        pad_to_multiple_of=4,
+    )
+    assert "attention_mask" not in batch
+    assert batch["input_ids"].tolist() == [[5, 6, 7, 8, 9, 4, 3, 1]]
+    assert batch["position_ids"].tolist() == [[0, 1, 0, 1, 2, 0, 1, 0]]
+    assert batch["labels"].tolist() == [[5, 6, -100, 8, 9, -100, 3, -100]]
+
+
+def test_collate_pads_unpacked_rows():
+    batch = collate_arrays([{"input_ids": [5, 6, 7]}, {"input_ids": [4]}], pad_id=1, pad_to_multiple_of=4)
+    assert batch["input_ids"].tolist() == [[5, 6, 7, 1], [4, 1, 1, 1]]
+    assert batch["attention_mask"].tolist() == [[1, 1, 1, 0], [1, 0, 0, 0]]
+    assert batch["labels"][1].tolist() == [4, -100, -100, -100]
+
+
+def test_padding_report_favors_grouping():
+    lengths = [10, 500] * 200
+    report = padding_report(lengths, 1024, batch_size=4)
+    assert report["random"] < report["bucket"] <= 1.0
+    assert report["pack"] > 0.9
+
+
+def write_shards(tmp_path, count=60, shards=3):
+    paths = []
+    for shard in range(shards):
+        path = tmp_path / f"part-{shard}.jsonl"
+        rows = [
+            {"instruction": f"What is STARS {i}", "input": "", "output": "a terminal automation system"}
+            for i in range(shard, count, shards)
+        ]
+        path.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+        paths.append(path)
+    return str(tmp_path / "part-*.jsonl")
+
+
+def streamed(pattern, split, seed=0):
+    rows = list(stream_tokenized([pattern], make_tokenizer(), 1, 64, split, 0.2, seed, shuffle_buffer=8, pack_buffer=16))
+    return [row["input_ids"] for row in rows], sum(len(row["seq_lengths"]) for row in rows)
+
+
+def test_streamed_split_covers_every_example_once(tmp_path):
+    pattern = write_shards(tmp_path)
+    train, train_examples = streamed(pattern, "train")
+    eval_rows, eval_examples = streamed(pattern, "eval")
+    assert train_examples + eval_examples == 60
+    assert 0 < eval_examples < 30
+    assert all(len(ids) <= 64 for ids in train + eval_rows)
+
+
+def test_streamed_shuffle_is_deterministic(tmp_path):
+    pattern = write_shards(tmp_path)
+    assert streamed(pattern, "train", seed=3) == streamed(pattern, "train", seed=3)
+    assert streamed(pattern, "train", seed=3) != streamed(pattern, "train", seed=4)
+
+
+def test_eval_assignment_depends_only_on_the_question():
+    example = {"instruction": "What is STARS", "input": "", "output": "one answer"}
+    assert is_eval_example(example, 0.5) == is_eval_example({**example, "output": "another"}, 0.5)
+    assert not is_eval_example(example, 0.0) and is_eval_example(example, 1.0)
@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from core.response_cache import ResponseCache  # noqa: E402
+
+
+def make_cache(**kwargs):
+    options = dict(max_entries=16, ttl_seconds=3600, similarity_threshold=0.9)
+    options.update(kwargs)
+    return ResponseCache(**options)
+
+
+def test_reworded_question_hits():
+    cache = make_cache()
+    cache.put("What does STARS stand for?", "Standard Terminal Automation Replacement System")
+    assert cache.get("what does STARS stand for") is not None
+    assert cache.get("What does the STARS stand for?") is not None
+    assert cache.stats()["similar_hits"] == 1
+
+
+def test_negated_question_misses():
+    cache = make_cache()
+    cache.put("What does STARS stand for?", "Standard Terminal Automation Replacement System")
+    assert cache.get("What does STARS not stand for?") is None
+
+
+def test_different_acronym_misses():
+    cache = make_cache()
+    cache.put("What is the purpose of the STARS program?", "answer")
+    assert cache.get("What is the purpose of the TAMR program?") is None
+
+
+def test_later_candidate_above_threshold_is_used():
+    cache = make_cache()
+    cache.put("What does STARZ stand for, please?", "wrong acronym")
+    cache.put("What does STARS stand for?", "expanded")
+    # The STARZ entry scores highest but fails the acronym guard
+    assert cache.get("What does STARS stand for, please?") == "expanded"
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from core.scheduler import AdmissionController  # noqa: E402
+
+
+def make_controller(**kwargs):
+    options = dict(max_active=1, max_queued=8, max_queued_per_session=4, max_active_per_session=1)
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+def test_cancel_in_the_tick_a_slot_is_released():
+    async def scenario():
+        controller = make_controller()
+        ticket = await controller.admit("a")
+        waiting = asyncio.create_task(controller.admit("b"))
+        await asyncio.sleep(0)
+        assert controller.queued == 1
+
+        # Cancel the queued request and free the slot before it can run
+        waiting.cancel()
+        ticket.release()
+        assert (controller.active, controller.queued) == (0, 0)
+        assert controller._active_by_session == {}
+
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert controller.queued == 0
+        with await asyncio.wait_for(controller.admit("c"), timeout=1):
+            assert controller.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_is_skipped_for_the_next_one():
+    async def scenario():
+        controller = make_controller()
+        ticket = await controller.admit("a")
+        cancelled = asyncio.create_task(controller.admit("b"))
+        served = asyncio.create_task(controller.admit("c"))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        ticket.release()
+        next_ticket = await asyncio.wait_for(served, timeout=1)
+        assert next_ticket.session_id == "c"
+        assert controller._active_by_session == {"c": 1}
+        next_ticket.release()
+
+    asyncio.run(scenario())
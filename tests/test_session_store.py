@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from core.session_store import SessionStore  # noqa: E402
+
+
+def test_peek_does_not_count_hits_or_reorder():
+    now = [0.0]
+    store = SessionStore(max_sessions=2, max_bytes=1000, ttl_seconds=60, size_of=len, clock=lambda: now[0])
+    store.put("a", "x")
+    store.put("b", "y")
+
+    assert store.peek("a") == "x"
+    assert store.peek("missing") is None
+    assert (store.hits, store.misses) == (0, 0)
+
+    # "a" is still the least recently used, so it is the one evicted
+    store.put("c", "z")
+    assert "a" not in store and "b" in store
+
+    now[0] = 61.0
+    assert store.peek("b") is None